@@ -0,0 +1,210 @@
+from itertools import cycle
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import timeit
+
+from opentelemetry.sdk._logs.export import LogExporter, LogExportResult
+from opentelemetry.sdk.metrics.export import MetricExporter, MetricExportResult
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from otel import TelemetryManager
+from telemetry import NoOpTelemetry
+
+SERVICE_NAME = "adventure-bench"
+
+# A loop through the world that never ends the game, so it can be replayed forever
+COMMANDS = ["go to town", "chapel", "pray", "go to town", "quest giver", "go to town", "list actions", "look around"]
+
+
+class NoOpSpanExporter(SpanExporter):
+    def export(self, spans):
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class NoOpLogExporter(LogExporter):
+    def export(self, batch):
+        return LogExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class NoOpMetricExporter(MetricExporter):
+    def export(self, metrics_data, timeout_millis=10_000, **kwargs):
+        return MetricExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis=10_000):
+        return True
+
+    def shutdown(self, timeout_millis=30_000, **kwargs):
+        pass
+
+
+class Telemetry:
+    """
+    The SDK pipeline the game uses, but exporting to no-op exporters, next to API no-op baselines.
+    """
+    def __init__(self):
+        self.sdk = TelemetryManager(
+            SERVICE_NAME, span_exporter=NoOpSpanExporter(), metric_exporter=NoOpMetricExporter(), log_exporter=NoOpLogExporter()
+        )
+        self.noop = NoOpTelemetry(SERVICE_NAME)
+        self.tracer = self.sdk.tracer
+        self.meter = self.sdk.meter
+        self.log_handler = self.sdk.log_handler
+        self.noop_tracer = self.noop.tracer
+        self.noop_meter = self.noop.meter
+
+
+def bench_dispatch(telemetry):
+    game = new_game(telemetry.noop)
+    commands = cycle(COMMANDS)
+    return lambda: game.process_command(next(commands))
+
+
+def bench_here(telemetry):
+    game = new_game(telemetry.noop)
+    return game.here
+
+
+def bench_span(tracer):
+    def run():
+        with tracer.start_as_current_span("action: go to town", attributes={"adventurer": "bench", "location": "start"}):
+            pass
+    return run
+
+
+def bench_log(handler):
+    logger = logging.getLogger(f"bench.{id(handler)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return lambda: logger.info("Action by bench: go to town")
+
+
+def bench_counter(meter):
+    counter = meter.create_up_down_counter(name="bench_swords", description="Benchmark counter")
+    return lambda: counter.add(1)
+
+
+def use_log_handler(manager):
+    root = logging.getLogger()
+    root.handlers[:] = [manager.log_handler] if manager.log_handler is not None else []
+    root.setLevel(logging.INFO if manager.log_handler is not None else logging.WARNING)
+
+
+def bench_turn(manager):
+    use_log_handler(manager)
+    game = new_game(manager)
+    commands = cycle(COMMANDS)
+    return lambda: game.take_turn(next(commands))
+
+
+def bench_batch(manager):
+    use_log_handler(manager)
+    game = new_game(manager)
+    run = lambda: game.take_turns(COMMANDS)
+    # Timed per command, to compare with turn
+    run.ops = len(COMMANDS)
+    return run
+
+
+def new_game(manager):
+    from events import EventLog
+    from main import AdventureGame
+
+    game = AdventureGame("bench", telemetry=manager)
+    # The command loop repeats the same few events, which the default rate limit would stop logging
+    game.event_log = EventLog(game.logger, game.scheduler.clock, burst=0)
+    game.start_journey()
+    return game
+
+
+# Each benchmark builds the callable to time from the shared telemetry setup
+BENCHMARKS = {
+    "dispatch": bench_dispatch,
+    "here": bench_here,
+    "span.noop": lambda t: bench_span(t.noop_tracer),
+    "span.sdk": lambda t: bench_span(t.tracer),
+    "log.null": lambda t: bench_log(logging.NullHandler()),
+    "log.otel": lambda t: bench_log(t.log_handler),
+    "counter.noop": lambda t: bench_counter(t.noop_meter),
+    "counter.sdk": lambda t: bench_counter(t.meter),
+    "turn.noop": lambda t: bench_turn(t.noop),
+    "turn.sdk": lambda t: bench_turn(t.sdk),
+    "batch.noop": lambda t: bench_batch(t.noop),
+    "batch.sdk": lambda t: bench_batch(t.sdk),
+}
+
+
+def run_benchmarks(names, number, repeat):
+    telemetry = Telemetry()
+    results = {}
+    for name in names:
+        func = BENCHMARKS[name](telemetry)
+        # The best of the repeats is the least disturbed by the rest of the machine
+        best = min(timeit.repeat(func, number=number, repeat=repeat)) / getattr(func, "ops", 1)
+        results[name] = {"ns_per_op": round(best / number * 1e9, 1), "number": number, "repeat": repeat}
+        print(f"{name:<14} {results[name]['ns_per_op']:>12.1f} ns/op", flush=True)
+    logging.getLogger().handlers.clear()
+    return results
+
+
+def compare(results, baseline, threshold, key="ns_per_op", unit="ns/op"):
+    """
+    Print the change against a previous run and return the names of benchmarks that got slower than threshold.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        change = result[key] / previous[key] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<14} {previous[key]:>12.1f} -> {result[key]:>12.1f} {unit} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the command hot path with and without telemetry.")
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS), help=f"Benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--number", type=int, default=20_000, help="Calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per benchmark, the best is kept")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", metavar="PATH", default=None, help="Previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.benchmarks, args.number, args.repeat)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+import events
+import os
+import uuid
+
+# Sessions, not bytes, kept in memory when idle ones are evicted to a session store
+DEFAULT_MAX_RESIDENT_SESSIONS = 10000
+
+
+class GameEngine:
+    """
+    GameEngine hosts many adventure sessions in a single process.
+
+    Clients (the terminal loop, bots, network front-ends) create a session and then submit
+    commands to it, getting the response text back. Commands are handled on the asyncio event
+    loop without blocking, so one process can multiplex thousands of adventurers while the
+    clients wait on their own I/O.
+
+    With a SessionStore, at most max_resident sessions are kept in memory. The least recently
+    used ones are saved to the store and resumed from it on their next command. The cap counts
+    sessions, not bytes: a resident session is a whole game of a few kilobytes, with its lock,
+    timer and telemetry, while a saved one is under a hundred, so size it from the memory a
+    process can give to sessions divided by the resident size.
+    """
+    def __init__(self, game_factory, store=None, max_resident=None, record=False):
+        # game_factory builds a new game for an adventurer name, usually the AdventureGame class.
+        # With a store it also needs a resume method building a game from saved bytes.
+        self.game_factory = game_factory
+        self.store = store
+        if max_resident is None:
+            max_resident = int(os.environ.get("ADVENTURE_MAX_RESIDENT_SESSIONS", DEFAULT_MAX_RESIDENT_SESSIONS))
+        if max_resident < 1:
+            raise ValueError("At least one session has to stay in memory.")
+        self.max_resident = max_resident
+        # Resident sessions, least recently used first
+        self.sessions = OrderedDict()
+        # Keep a command log of every new session, for replaying it in a simulation
+        self.record = record
+
+    def create_session(self, adventurer_name, session_id=None):
+        """
+        Start a new adventure and return its session id.
+        """
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+        elif session_id in self.sessions or (self.store is not None and session_id in self.store):
+            raise KeyError(f"Session {session_id} already exists.")
+
+        game = self.game_factory(adventurer_name, session_id=session_id)
+        self.sessions[session_id] = game
+        if self.record:
+            game.start_recording()
+        game.start_journey()
+        self.evict()
+        return session_id
+
+    def get_session(self, session_id):
+        game = self.sessions.get(session_id)
+        if game is not None:
+            self.sessions.move_to_end(session_id)
+            return game
+        data = self.store.load(session_id) if self.store is not None else None
+        if data is None:
+            raise KeyError(f"Unknown session {session_id}.")
+        game = self.game_factory.resume(data, session_id=session_id)
+        self.sessions[session_id] = game
+        if self.record:
+            game.start_recording()
+        self.evict()
+        return game
+
+    def evict(self):
+        """
+        Save the least recently used sessions to the store until no more than max_resident are in memory.
+        """
+        if self.store is None:
+            return
+        evicted = []
+        while len(self.sessions) > self.max_resident:
+            evicted.append(self.sessions.popitem(last=False))
+        self._suspend(evicted)
+
+    def suspend_all(self):
+        """
+        Save every resident session to the store and release it, so a new process can resume them.
+        """
+        evicted, self.sessions = list(self.sessions.items()), OrderedDict()
+        self._suspend(evicted)
+
+    def _suspend(self, sessions):
+        if sessions:
+            self.store.save_many([(session_id, game.save()) for session_id, game in sessions])
+            for _, game in sessions:
+                game.release()
+
+    def welcome(self, session_id):
+        """
+        Return the welcome text and description of the starting location for a session.
+        """
+        return self.get_session(session_id).intro
+
+    def is_active(self, session_id):
+        return self.get_session(session_id).state.game_active
+
+    async def submit(self, session_id, command, context=None):
+        """
+        Apply a single command to a session and return the response.
+        A context from the client's own trace becomes the parent of the action span.
+        """
+        game = self.get_session(session_id)
+        if not game.state.game_active:
+            return "Your adventure has ended."
+        return game.take_turn(command, context)
+
+    async def submit_batch(self, session_id, commands, stop_on_failure=False, context=None):
+        """
+        Apply commands to a session in order under a single span and return the responses of the
+        commands applied. See AdventureGame.take_turns.
+        """
+        game = self.get_session(session_id)
+        if not game.state.game_active:
+            return ["Your adventure has ended."]
+        return game.take_turns(commands, stop_on_failure, context)
+
+    def restart_session(self, session_id, adventurer_name=None):
+        """
+        Reset a session to the beginning of the adventure and return the new welcome text.
+        """
+        game = self.get_session(session_id)
+        game.restart_adventure(adventurer_name)
+        return game.start_journey()
+
+    def close_session(self, session_id):
+        game = self.sessions.pop(session_id, None)
+        if self.store is not None:
+            self.store.delete(session_id)
+        if game is None:
+            return
+        game.log_event(events.JOURNEY_CLOSED)
+        game.close()
+
+    def __len__(self):
+        return len(self.sessions)
@@ -0,0 +1,142 @@
+from collections import namedtuple
+import logging
+import os
+
+# A kind of thing that happens in the game. The code is stable and meant for queries, the
+# message never changes either, everything that varies goes into attributes.
+Event = namedtuple("Event", ["code", "level", "message"])
+
+JOURNEY_STARTED = Event("journey.started", logging.INFO, "Welcome to your text adventure! Type 'quit' to exit.")
+JOURNEY_CLOSED = Event("journey.closed", logging.INFO, "The adventure has ended.")
+ACTION = Event("action", logging.INFO, "The adventurer took an action.")
+ACTIONS = Event("actions", logging.INFO, "The adventurer took a batch of actions.")
+SUPPRESSED = Event("events.suppressed", logging.INFO, "Repeated events were not logged.")
+
+STONE_SLAB = Event(
+    "blacksmith.stone_slab", logging.INFO,
+    "As you enter the blacksmith you trip over a small stone slab. You feel lighter somehow."
+)
+BOX_FOUND = Event(
+    "blacksmith.box_found", logging.INFO,
+    "While rebuilding the blacksmith, amongst the ashes you find the burnt remains of the decorative box. Laying beside it is a glowing, unburnt, piece of parchment which reads: 'Congratulations, Adventurer!'. Below it is a long cryptic looking message."
+)
+CRYPTIC_MESSAGE = Event(
+    "blacksmith.cryptic_message", logging.INFO,
+    "U2VuZCB0aGUgcGhyYXNlICJJIGZvdW5kIHRoZSBzZWNyZXQgd2l0aCBvYnNlcnZhYmlsaXR5ISIgdG8gVG9tIEdsZW5uIG9yIEpheSBDbGlmZm9yZCBhdCBodHRwczovL3NsYWNrLmdyYWZhbmEuY29tIGZvciB5b3VyIHJld2FyZC4="
+)
+FORGE_STILL_HOT = Event("blacksmith.forge_still_hot", logging.WARNING, "You requested another sword, but the forge is still hot!")
+SWORD_REFUSED = Event(
+    "blacksmith.sword_refused", logging.ERROR,
+    "The blacksmith refuses to forge you another sword. You have wasted too much of his time."
+)
+WIZARD_DEFEATED = Event("wizard.defeated", logging.INFO, "The adventurer has successfully defeated the wizard.")
+CURSED_SWORD_FALTERS = Event(
+    "wizard.cursed_sword", logging.CRITICAL,
+    "Your sword falters as you try to strike the wizard down. The wizard laughs as you fall to the ground."
+)
+SWORD_SHATTERED = Event(
+    "wizard.sword_shattered", logging.WARNING,
+    "Your sword is not powerful enough to defeat the wizard. Your sword shatters, you should probably get a new one."
+)
+CURSE_TRANSFERRED = Event(
+    "priest.curse_transferred", logging.WARNING,
+    "The priest transfers the curse from the sword to himself. He falls to the ground."
+)
+SWORD_BLESSED = Event("priest.sword_blessed", logging.WARNING, "The sword is now blessed. You feel a warm glow.")
+SWORD_ENCHANTED = Event(
+    "mysterious_man.sword_enchanted", logging.ERROR,
+    "The evil wizard has enchanted your sword with dark magic. You feel a chill run down your spine. This is a warning..."
+)
+QUEST_GIVER_KILLED = Event(
+    "quest_giver.killed", logging.CRITICAL,
+    "The sword whispers; I killed them! you will never destroy the wizard with me in your hands! Hahahaha"
+)
+HOLY_SWORD_WHISPERS = Event(
+    "quest_giver.holy_sword", logging.WARNING,
+    "The sword whispers; I will help you defeat the wizard. I am your only hope."
+)
+WEAK_SWORD = Event(
+    "quest_giver.weak_sword", logging.WARNING,
+    "Ok, if you're sure... But it seems your sword may not be powerful enough to defeat the wizard."
+)
+
+# Identical events a session logs per window before the rest of the window is suppressed
+DEFAULT_BURST = 5
+DEFAULT_WINDOW_SEC = 60.0
+
+# The attributes that, with the code, make events identical for rate limiting. Only ones with a
+# few values each, so a session holds a few windows at most: the actions of a batch are left out.
+RATE_LIMIT_ATTRIBUTES = ("location", "action", "outcome")
+
+
+class EventLog:
+    """
+    EventLog writes the events of one session as log records carrying the event code, the
+    session attributes and the event attributes.
+
+    Identical events, with the same code and RATE_LIMIT_ATTRIBUTES, are rate limited per
+    session: at most burst of them are logged per window of window seconds. The first one
+    logged after a window with suppressed events carries their number in events.suppressed.
+    Windows that are over without another such event are dropped, logging their suppressed
+    events as a SUPPRESSED event, and so does flush for those left when the session ends.
+    """
+    def __init__(self, logger, clock, burst=None, window=None):
+        # logger is the LoggerAdapter of the session telemetry, its extra holds the session attributes
+        self.logger = logger
+        self.clock = clock
+        self.burst = burst if burst is not None else int(os.environ.get("ADVENTURE_LOG_BURST", DEFAULT_BURST))
+        self.window = window if window is not None else float(os.environ.get("ADVENTURE_LOG_WINDOW_SEC", DEFAULT_WINDOW_SEC))
+        # Event code and rate limit attributes -> [window start, events in the window, suppressed events],
+        # in the order the windows started
+        self._windows = {}
+
+    def emit(self, event, **attributes):
+        if not self.logger.isEnabledFor(event.level):
+            return
+        suppressed = 0
+        if self.burst > 0:
+            key = (event.code, *(attributes.get(name) for name in RATE_LIMIT_ATTRIBUTES))
+            now = self.clock()
+            window = self._windows.get(key)
+            if window is not None and now - window[0] >= self.window:
+                suppressed = window[2]
+                del self._windows[key]
+                window = None
+            self._prune(now)
+            if window is None:
+                window = self._windows[key] = [now, 0, 0]
+            window[1] += 1
+            if window[1] > self.burst:
+                window[2] += 1
+                return
+        if suppressed:
+            attributes["events.suppressed"] = suppressed
+        self._log(event, attributes)
+
+    def flush(self):
+        """
+        Log how many events of each kind are still suppressed, and start over.
+        """
+        windows, self._windows = self._windows, {}
+        for key, (_, _, suppressed) in windows.items():
+            self._log_suppressed(key, suppressed)
+
+    def _prune(self, now):
+        # The windows that started first are over first
+        over = []
+        for key, (start, _, _) in self._windows.items():
+            if now - start < self.window:
+                break
+            over.append(key)
+        for key in over:
+            self._log_suppressed(key, self._windows.pop(key)[2])
+
+    def _log_suppressed(self, key, suppressed):
+        if suppressed:
+            code, *values = key
+            attributes = {name: value for name, value in zip(RATE_LIMIT_ATTRIBUTES, values) if value is not None}
+            self._log(SUPPRESSED, {**attributes, "suppressed.code": code, "events.suppressed": suppressed})
+
+    def _log(self, event, attributes):
+        # A LoggerAdapter replaces the extra of a call with its own, so they are merged here
+        self.logger.logger.log(event.level, event.message, extra={**self.logger.extra, "event.code": event.code, **attributes})
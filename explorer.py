@@ -0,0 +1,229 @@
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import sys
+import time
+
+from main import AdventureGame, FORGE_BURN_HEAT
+from scheduler import SimulatedScheduler
+from simulation import simulation_telemetry
+from state import GameState
+from world import load_world
+
+# Waiting only matters at the heats where the forge changes behaviour: check_sword forges a
+# sword from 10, melts it from 21, and the blacksmith burns down at FORGE_BURN_HEAT.
+HEAT_THRESHOLDS = (10, 21, FORGE_BURN_HEAT)
+WAIT = "wait"
+
+_game = None
+
+
+def _worker_game():
+    # One game per process, every expansion restores the state to explore onto it
+    global _game
+    if _game is None:
+        _game = AdventureGame("explorer", scheduler=SimulatedScheduler(), telemetry=simulation_telemetry(),
+                              session_id="explorer")
+    return _game
+
+
+def canonical(game):
+    """
+    Return the state of the game as a hashable key, with the forge heat settled to the current
+    clock so that states only differing in when the forge was lit compare equal.
+    """
+    state = game.state
+    heating = state.is_heating_forge
+    return (state.flags, state.location, game.heat, 0.0 if heating else None, state.failed_sword_attempts)
+
+
+def _load(game, key):
+    game.scheduler.clock.now = 0.0
+    game.restore(key)
+
+
+def expand(key):
+    """
+    Apply every command available in a state and return (command, next state, enabled) per command.
+    enabled is False when the command was refused by its prerequisite.
+    """
+    game = _worker_game()
+    location = game.locations[key[1]]
+    results = []
+    for command, action in location.dispatch.items():
+        _load(game, key)
+        enabled = action.pre_requisite is None or bool(action.pre_requisite(game))
+        game.process_command(command)
+        results.append((command, canonical(game), enabled))
+
+    # Let time pass until the forge reaches its next interesting heat
+    _load(game, key)
+    if game.state.is_heating_forge:
+        heat = game.heat
+        target = next((threshold for threshold in HEAT_THRESHOLDS if threshold > heat), None)
+        if target is not None:
+            game.scheduler.advance(target - heat)
+            game.increase_heat_periodically()
+            results.append((f"{WAIT} {target - heat}", canonical(game), True))
+    return results
+
+
+def expand_many(keys):
+    return [(key, expand(key)) for key in keys]
+
+
+def ending_of(key, command):
+    state = GameState.from_snapshot(key)
+    if state.has_evil_sword:
+        return f"evil sword ({command})"
+    if state.has_holy_sword:
+        return f"holy sword ({command})"
+    return f"other ({command})"
+
+
+class Exploration:
+    """
+    The reachable state graph of the game, found breadth first from the start, so the path
+    recorded to every state is a shortest one.
+    """
+    def __init__(self):
+        # State -> (previous state, command), the previous state of the start is None
+        self.parents = {}
+        self.edges = {}
+        self.endings = {}
+        self.enabled_actions = set()
+        self.levels = 0
+
+    def path(self, key):
+        commands = []
+        while True:
+            parent, command = self.parents[key]
+            if parent is None:
+                return commands[::-1]
+            commands.append(command)
+            key = parent
+
+    def dead_ends(self):
+        """
+        Return the active states from which no ending can be reached.
+        """
+        reverse = {}
+        for key, successors in self.edges.items():
+            for successor in successors:
+                reverse.setdefault(successor, set()).add(key)
+        can_end = set(self.endings)
+        queue = deque(self.endings)
+        while queue:
+            for previous in reverse.get(queue.popleft(), ()):
+                if previous not in can_end:
+                    can_end.add(previous)
+                    queue.append(previous)
+        return [key for key in self.parents if key not in can_end and GameState.from_snapshot(key).game_active]
+
+
+def explore(workers=1, chunk_size=64):
+    """
+    Explore every reachable state, expanding each level of the search in parallel on workers processes.
+    """
+    game = AdventureGame("explorer", scheduler=SimulatedScheduler(), telemetry=simulation_telemetry(), session_id="explorer")
+    start = canonical(game)
+    game.close()
+
+    exploration = Exploration()
+    exploration.parents[start] = (None, None)
+    frontier = [start]
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while frontier:
+            exploration.levels += 1
+            chunks = [frontier[i:i + chunk_size] for i in range(0, len(frontier), chunk_size)]
+            expanded = executor.map(expand_many, chunks) if executor else map(expand_many, chunks)
+            frontier = []
+            for results in expanded:
+                for key, transitions in results:
+                    successors = exploration.edges.setdefault(key, set())
+                    for command, successor, enabled in transitions:
+                        if enabled and not command.startswith(WAIT):
+                            exploration.enabled_actions.add((key[1], command))
+                        if successor == key:
+                            continue
+                        successors.add(successor)
+                        if successor in exploration.parents:
+                            continue
+                        exploration.parents[successor] = (key, command)
+                        if GameState.from_snapshot(successor).game_active:
+                            frontier.append(successor)
+                        else:
+                            exploration.endings[successor] = ending_of(successor, command)
+    finally:
+        if executor:
+            executor.shutdown()
+    return exploration
+
+
+def report(exploration):
+    world = load_world(AdventureGame)
+    actions = {(name, command) for name, location in world.locations.items() for command in location.dispatch}
+    visited_locations = {key[1] for key in exploration.parents}
+    flags_seen = {name: set() for name in GameState.FLAGS}
+    for key in exploration.parents:
+        state = GameState.from_snapshot(key)
+        for name in GameState.FLAGS:
+            flags_seen[name].add(getattr(state, name))
+
+    endings = {}
+    for key, ending in exploration.endings.items():
+        path = exploration.path(key)
+        if ending not in endings or len(path) < len(endings[ending]["path"]):
+            endings[ending] = {"path": path, "states": 0}
+    for ending, count in Counter(exploration.endings.values()).items():
+        endings[ending]["states"] = count
+
+    dead_ends = exploration.dead_ends()
+    return {
+        "states": len(exploration.parents),
+        "transitions": sum(len(successors) for successors in exploration.edges.values()),
+        "depth": exploration.levels,
+        "endings": endings,
+        "dead_ends": {
+            "states": len(dead_ends),
+            "examples": [
+                {"state": GameState.from_snapshot(key).as_dict(), "path": exploration.path(key)}
+                for key in sorted(dead_ends, key=lambda key: len(exploration.path(key)))[:3]
+            ],
+        },
+        "coverage": {
+            "locations": f"{len(visited_locations)}/{len(world.locations)}",
+            "unvisited_locations": sorted(set(world.locations) - visited_locations),
+            "actions": f"{len(exploration.enabled_actions)}/{len(actions)}",
+            "never_enabled_actions": sorted(f"{location}: {command}" for location, command in actions - exploration.enabled_actions),
+            "flags_never_changed": sorted(name for name, values in flags_seen.items() if len(values) < 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explore every reachable state of the game and report endings and coverage.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes expanding states in parallel")
+    parser.add_argument("--chunk-size", type=int, default=64, help="States handed to a worker at once")
+    parser.add_argument("--json", metavar="PATH", default=None, help="Also write the report as JSON to PATH")
+    parser.add_argument("--strict", action="store_true", help="Exit non-zero if any state cannot reach an ending")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    exploration = explore(args.workers, args.chunk_size)
+    summary = report(exploration)
+    summary["elapsed_sec"] = round(time.perf_counter() - start, 3)
+
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.strict and summary["dead_ends"]["states"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+from opentelemetry import metrics
+from scheduler import default_scheduler
+from state import GameState
+import threading
+import weakref
+
+
+class SessionGauges:
+    """
+    SessionGauges reports the forges of all live sessions in a process from one set of callbacks.
+
+    Sessions register themselves while they are alive. On every collection forge_heat reports
+    the max and mean heat of all sessions, so its series do not grow with the adventurers who
+    play. The number of forges heating and blacksmiths burned down are reported as totals.
+
+    Sword inventories are totals kept up to date by the sessions, which report a change
+    whenever the sword flags of their state differ from what they last reported. The totals
+    are only handed to the SDK when metrics are collected.
+
+    The sessions also time their commands into command_duration and their journeys into
+    journey_duration, and the shared timer scheduler reports how many timers it holds and how
+    late it fires them.
+
+    When sessions are spread over worker processes, the workers do not observe their sessions
+    themselves (observe_sessions=False) but send snapshots of them to the supervisor, whose
+    gauges report the sessions of all workers together with update_remote.
+    """
+    # Sword instrument names and the state flag each one counts
+    SWORDS = (
+        ("swords", "The number of regular swords owned", GameState.has_sword.mask),
+        ("holy_sword", "The number of holy swords owned", GameState.has_holy_sword.mask),
+        ("evil_sword", "The number of evil swords owned", GameState.has_evil_sword.mask),
+    )
+
+    def __init__(self, meter, observe_sessions=True):
+        # Sessions that are never closed must not be kept alive by the metrics
+        self._sessions = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.swords = dict.fromkeys((mask for _, _, mask in self.SWORDS), 0)
+        # The latest snapshot of every worker process, by worker
+        self._remote = {}
+
+        self.command_duration = meter.create_histogram(
+            name="command_duration",
+            unit="ms",
+            description="Time taken to process a command"
+        )
+        self.journey_duration = meter.create_histogram(
+            name="journey_duration",
+            unit="s",
+            description="Time from the start of a journey to its end"
+        )
+        meter.create_observable_gauge(
+            name="scheduler_lag",
+            unit="ms",
+            description="The longest delay between a timer's deadline and its callback since the last collection",
+            callbacks=[self.observe_scheduler_lag]
+        )
+        meter.create_observable_gauge(
+            name="scheduler_timers",
+            description="The number of pending timers",
+            callbacks=[self.observe_scheduler_timers]
+        )
+        if not observe_sessions:
+            return
+
+        meter.create_observable_gauge(
+            name="forge_heat",
+            description="The current heat level of the forge",
+            callbacks=[self.observe_forge_heat]
+        )
+        meter.create_observable_gauge(
+            name="forges_heating",
+            description="The number of sessions with the forge heating",
+            callbacks=[self.observe_forges_heating]
+        )
+        meter.create_observable_gauge(
+            name="blacksmiths_burned_down",
+            description="The number of sessions where the blacksmith burned down",
+            callbacks=[self.observe_burned_down]
+        )
+        meter.create_observable_gauge(
+            name="live_sessions",
+            description="The number of sessions in this process",
+            callbacks=[self.observe_live_sessions]
+        )
+        for name, description, mask in self.SWORDS:
+            meter.create_observable_up_down_counter(
+                name=name,
+                description=description,
+                callbacks=[self.sword_observer(mask)]
+            )
+
+    def add(self, game):
+        with self._lock:
+            self._sessions[game.session_id] = game
+
+    def discard(self, game):
+        with self._lock:
+            if self._sessions.get(game.session_id) is game:
+                del self._sessions[game.session_id]
+
+    def move_swords(self, old, new):
+        """
+        Move a session's swords from the old to the new sword flags of its state.
+        """
+        with self._lock:
+            for mask in self.swords:
+                self.swords[mask] += bool(new & mask) - bool(old & mask)
+
+    def games(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def snapshot(self):
+        """
+        Return what the gauges report about the sessions of this process, for update_remote in
+        another one.
+        """
+        games = self.games()
+        heats = [game.heat for game in games]
+        with self._lock:
+            swords = dict(self.swords)
+        return {
+            "sessions": len(games),
+            "heat_max": max(heats, default=0),
+            "heat_sum": sum(heats),
+            "heating": sum(game.state.is_heating_forge for game in games),
+            "burned_down": sum(game.state.blacksmith_burned_down for game in games),
+            "swords": swords,
+        }
+
+    def update_remote(self, source, snapshot):
+        with self._lock:
+            self._remote[source] = snapshot
+
+    def discard_remote(self, source):
+        with self._lock:
+            self._remote.pop(source, None)
+
+    def remote(self):
+        with self._lock:
+            return list(self._remote.values())
+
+    def observe_forge_heat(self, options):
+        heats = [game.heat for game in self.games()]
+        remote = [snapshot for snapshot in self.remote() if snapshot["sessions"]]
+        sessions = len(heats) + sum(snapshot["sessions"] for snapshot in remote)
+        if not sessions:
+            return []
+        heat_max = max([*heats, *(snapshot["heat_max"] for snapshot in remote)])
+        heat_sum = sum(heats) + sum(snapshot["heat_sum"] for snapshot in remote)
+        return [
+            metrics.Observation(heat_max, {"location": "blacksmith", "aggregation": "max"}),
+            metrics.Observation(heat_sum / sessions, {"location": "blacksmith", "aggregation": "mean"}),
+        ]
+
+    def observe_forges_heating(self, options):
+        heating = sum(game.state.is_heating_forge for game in self.games())
+        heating += sum(snapshot["heating"] for snapshot in self.remote())
+        return [metrics.Observation(heating, {"location": "blacksmith"})]
+
+    def observe_burned_down(self, options):
+        burned_down = sum(game.state.blacksmith_burned_down for game in self.games())
+        burned_down += sum(snapshot["burned_down"] for snapshot in self.remote())
+        return [metrics.Observation(burned_down, {"location": "blacksmith"})]
+
+    def observe_live_sessions(self, options):
+        return [metrics.Observation(len(self) + sum(snapshot["sessions"] for snapshot in self.remote()))]
+
+    def observe_scheduler_lag(self, options):
+        return [metrics.Observation(default_scheduler.take_max_lag() * 1000)]
+
+    def observe_scheduler_timers(self, options):
+        return [metrics.Observation(len(default_scheduler))]
+
+    def sword_observer(self, mask):
+        def observe_swords(options):
+            return [metrics.Observation(self.swords[mask] + sum(snapshot["swords"][mask] for snapshot in self.remote()))]
+        return observe_swords
+
+
+_gauges = {}
+_gauges_lock = threading.Lock()
+
+
+def session_gauges(meter, observe_sessions=True):
+    """
+    Return the SessionGauges of a meter, creating them on first use so their callbacks are only registered once.
+    """
+    with _gauges_lock:
+        gauges = _gauges.get(meter)
+        if gauges is None:
+            gauges = _gauges[meter] = SessionGauges(meter, observe_sessions=observe_sessions)
+        return gauges
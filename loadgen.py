@@ -0,0 +1,253 @@
+from collections import Counter
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from otlp_stub import StubOTLPReceiver
+from routes import RANDOM_ROUTE, ROUTES, journey_ending, route_steps
+
+
+class RatePacer:
+    """
+    Spreads commands from all bots evenly in time to hold a target rate. A rate of 0 means as fast as possible.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = None
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.perf_counter()
+        # Never try to catch up on slots missed while the process was saturated
+        if self.next_slot is None or self.next_slot < now:
+            self.next_slot = now
+        slot = self.next_slot
+        self.next_slot += self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class LoadReport:
+    def __init__(self):
+        # Latencies are per submission, a whole batch with --batch
+        self.latencies = []
+        self.commands = 0
+        self.journeys = Counter()
+        self.endings = Counter()
+        self.started = None
+        self.finished = None
+
+    def percentile(self, latencies, q):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        latencies = sorted(self.latencies)
+        return {
+            "elapsed_sec": round(elapsed, 3),
+            "commands": self.commands,
+            "commands_per_sec": round(self.commands / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                name: round(self.percentile(latencies, q) * 1000, 4)
+                for name, q in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99), ("max", 1.0))
+            },
+            "journeys": dict(self.journeys),
+            "endings": dict(self.endings),
+        }
+
+
+def batched(steps):
+    # Group the commands between waits into lists, random steps are then all picked off the menu the batch starts at
+    batch = []
+    for step in steps:
+        if step.startswith("wait "):
+            if batch:
+                yield batch
+                batch = []
+            yield step
+        else:
+            batch.append(step)
+    if batch:
+        yield batch
+
+
+def menu_size(response):
+    # Count the numbered actions on the last menu of a response the server sent
+    menu = response[response.rfind("Available actions:"):].split("\n", 1)[0]
+    return menu.count(",") + 1
+
+
+async def run_bot(engine, index, routes, pacer, deadline, report, rng, batch=False):
+    session_id = engine.create_session(f"bot-{index}")
+    try:
+        while time.perf_counter() < deadline:
+            route = rng.choice(routes)
+            report.journeys[route] += 1
+            actions = lambda: len(engine.get_session(session_id).action_menu()[0])
+            steps = route_steps(route, rng, actions)
+            for step in batched(steps) if batch else steps:
+                if isinstance(step, str) and step.startswith("wait "):
+                    await asyncio.sleep(min(float(step.split()[1]), max(deadline - time.perf_counter(), 0)))
+                    if time.perf_counter() >= deadline:
+                        return
+                    continue
+                await pacer.wait()
+                start = time.perf_counter()
+                if batch:
+                    applied = len(await engine.submit_batch(session_id, step))
+                    last_command = step[applied - 1]
+                else:
+                    await engine.submit(session_id, step)
+                    applied, last_command = 1, step
+                report.latencies.append(time.perf_counter() - start)
+                report.commands += applied
+                if not engine.is_active(session_id):
+                    report.endings[journey_ending(engine.get_session(session_id), last_command)] += 1
+                    break
+                if time.perf_counter() >= deadline:
+                    return
+            engine.restart_session(session_id)
+    finally:
+        engine.close_session(session_id)
+
+
+async def run_remote_bot(address, websocket, index, routes, pacer, deadline, report, rng):
+    """
+    Play like run_bot, but as a client of a game server, so the network front-end is measured too.
+    Latencies include the round trip to the server.
+    """
+    from server import RESTART_PROMPT, GameClient
+
+    client, _ = await GameClient.connect(*address, websocket=websocket)
+    try:
+        response = await client.send(f"bot-{index}")
+        while time.perf_counter() < deadline:
+            route = rng.choice(routes)
+            report.journeys[route] += 1
+            for step in route_steps(route, rng, lambda: menu_size(response)):
+                if step.startswith("wait "):
+                    await asyncio.sleep(min(float(step.split()[1]), max(deadline - time.perf_counter(), 0)))
+                    if time.perf_counter() >= deadline:
+                        return
+                    continue
+                await pacer.wait()
+                start = time.perf_counter()
+                response = await client.send(step)
+                report.latencies.append(time.perf_counter() - start)
+                report.commands += 1
+                if response.endswith(RESTART_PROMPT):
+                    # The server only tells the bot that the adventure ended, not how
+                    report.endings["quit" if step in ("quit", "exit") else "ended"] += 1
+                    break
+                if time.perf_counter() >= deadline:
+                    return
+            if response.endswith(RESTART_PROMPT):
+                await client.send("yes")
+                response = await client.send("")
+    finally:
+        await client.close()
+
+
+async def run_load(bots, rate, duration, routes, seed=None, store=None, max_resident=None, server=None, websocket=False,
+                   batch=False):
+    """
+    Run bots concurrent adventurers against one in-process engine and return a LoadReport.
+    With a (host, port) server address the bots connect to a game server instead.
+    With batch the bots submit the commands between waits of a journey as one batch.
+    """
+    pacer = RatePacer(rate)
+    report = LoadReport()
+    rng = random.Random(seed)
+    report.started = time.perf_counter()
+    deadline = report.started + duration
+    if server is not None:
+        await asyncio.gather(*(
+            run_remote_bot(server, websocket, index, routes, pacer, deadline, report, random.Random(rng.random()))
+            for index in range(bots)
+        ))
+        report.finished = time.perf_counter()
+        return report
+
+    from engine import GameEngine
+    from main import AdventureGame
+
+    engine = GameEngine(AdventureGame, store=store, max_resident=max_resident)
+    await asyncio.gather(*(
+        run_bot(engine, index, routes, pacer, deadline, report, random.Random(rng.random()), batch)
+        for index in range(bots)
+    ))
+    report.finished = time.perf_counter()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent bot adventurers against the game engine.")
+    parser.add_argument("--bots", type=int, default=100, help="Number of concurrent adventurers")
+    parser.add_argument("--rate", type=float, default=0.0, help="Target commands per second across all bots, 0 for unlimited")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run for")
+    parser.add_argument("--routes", default=",".join([*ROUTES, RANDOM_ROUTE]),
+                        help=f"Comma separated routes to pick from: {', '.join([*ROUTES, RANDOM_ROUTE])}")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stub-receiver", type=int, metavar="PORT", default=None,
+                        help="Start a stub OTLP/HTTP receiver on PORT and export telemetry to it")
+    parser.add_argument("--session-store", metavar="PATH", default=None,
+                        help="Evict idle sessions to a SQLite session store at PATH")
+    parser.add_argument("--max-resident", type=int, default=None, help="Number of sessions kept in memory with --session-store")
+    parser.add_argument("--server", metavar="HOST:PORT", default=None,
+                        help="Play against a game server started with server.py instead of an in-process engine")
+    parser.add_argument("--websocket", action="store_true", help="Connect to the server over WebSocket")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit the commands between waits as one batch, --rate then paces batches")
+    parser.add_argument("--json", metavar="PATH", default=None, help="Also write the report as JSON to PATH")
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(",") if route.strip()]
+    unknown = [route for route in routes if route not in ROUTES and route != RANDOM_ROUTE]
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(unknown)}")
+
+    server = None
+    if args.server is not None:
+        host, _, port = args.server.rpartition(":")
+        if not host or not port.isdigit():
+            parser.error("--server needs HOST:PORT.")
+        server = (host, int(port))
+        if args.batch:
+            parser.error("--batch only works with the in-process engine.")
+
+    receiver = None
+    if args.stub_receiver is not None:
+        receiver = StubOTLPReceiver(port=args.stub_receiver).start()
+        os.environ.pop("SETUP", None)
+        os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = receiver.endpoint
+
+    store = None
+    if args.session_store is not None:
+        from store import SessionStore
+
+        store = SessionStore(args.session_store)
+    report = asyncio.run(run_load(args.bots, args.rate, args.duration, routes, args.seed, store, args.max_resident,
+                                  server, args.websocket, args.batch))
+    summary = report.summary()
+    if receiver is not None:
+        from main import SERVICE_NAME
+        from telemetry import get_telemetry
+
+        get_telemetry(SERVICE_NAME).force_flush()
+        summary["receiver"] = receiver.stats()
+        receiver.stop()
+
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
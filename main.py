@@ -1,369 +1,256 @@
-from otel import CustomLogFW, CustomMetrics, CustomTracer
-from opentelemetry import metrics, trace
+from telemetry import get_telemetry
+from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
-import threading
+from engine import GameEngine
+from render import Colors, OutputWriter, load_renderer
+from store import SessionStore
+from gauges import session_gauges
+from scheduler import default_scheduler
+from world import load_world, normalize_command
+from state import GameState
+import events
+import argparse
+import asyncio
+import os
+import struct
 import time
-import logging
+import uuid
 import sys
+import threading
 
-class Colors:
-    RESET = "\033[0m"
-    RED = "\033[31m"
-    GREEN = "\033[32m"
-    YELLOW = "\033[33m"
-    BLUE = "\033[34m"
-    MAGENTA = "\033[35m"
-    CYAN = "\033[36m"
+SERVICE_NAME = "adventure"
 
-class AdventureGame:
-    def __init__(self):
-        service_name = "adventure"
-        # Get the adventurer's name from the user
-        self.adventurer_name = input("Enter your name, brave adventurer: ")
-        logFW = CustomLogFW(service_name=service_name)
-        handler = logFW.setup_logging()
-        logging.getLogger().addHandler(handler)
-        logging.getLogger().setLevel(logging.INFO)
-
-        metrics = CustomMetrics(service_name=service_name)
-        meter = metrics.get_meter()
-        self.meter = meter  # Store meter as instance variable for later use
+# Heat at which the forge burns the blacksmith down
+FORGE_BURN_HEAT = 50
 
-        ct = CustomTracer(service_name=service_name)
-        self.trace = ct.get_trace()
-        self.tracer = self.trace.get_tracer(service_name)
-        
-        # Create an observable gauge for the forge heat level (keep this as gauge)
-        self.forge_heat_gauge = meter.create_observable_gauge(
-            name="forge_heat",
-            description="The current heat level of the forge",
-            callbacks=[self.observe_forge_heat]
-        )
+# Saved sessions: format version, wall clock time of the save and the length of the adventurer
+# name, followed by the name and the packed game state
+SAVE_HEADER = struct.Struct("<BdH")
+SAVE_VERSION = 1
 
-        # Create up/down counters for sword states instead of observable gauges
-        self.sword_counter = meter.create_up_down_counter(
-            name="swords",
-            description="The number of regular swords owned"
-        )
-        self.sword_counter.add(0)  # Initialize the sword counter to 0
-        
-        self.holy_sword_counter = meter.create_up_down_counter(
-            name="holy_sword",
-            description="The number of holy swords owned"
-        )
+# Responses to commands that did nothing
+UNKNOWN_COMMAND = "I don't understand that command."
+NOT_NOW = "You can't do that right now."
 
-        self.holy_sword_counter.add(0)  # Initialize the holy sword counter to 0
+# Commands understood everywhere, on top of the actions of each location
+BUILTIN_COMMANDS = frozenset(("quit", "exit", "look around", "here", "list actions"))
+
+class AdventureGame:
+    def __init__(self, adventurer_name, scheduler=default_scheduler, telemetry=None, session_id=None):
+        self.adventurer_name = adventurer_name
+        self.session_id = session_id or uuid.uuid4().hex
+        self.scheduler = scheduler
+        # Providers are set up once per process, the session only gets its own attributes
+        self.telemetry = (telemetry or get_telemetry(SERVICE_NAME)).session(self.session_id, adventurer_name)
+        self.tracer = self.telemetry.tracer
+        self.logger = self.telemetry.logger
+        # Game events go through a per-session log that drops repeats of the same event
+        self.event_log = events.EventLog(self.logger, scheduler.clock)
+        meter = self.telemetry.meter
+        self.meter = meter  # Store meter as instance variable for later use
+        self.trace = trace
+        self.journey_span = None
+        self.journey_context = None
+        self.journey_started_at = None
+        self.intro = None
+        self.turn_status = None
         
-        self.evil_sword_counter = meter.create_up_down_counter(
-            name="evil_sword",
-            description="The number of evil swords owned"
-        )
+        # The world is compiled once per process and shared by every session
+        self.world = load_world(type(self))
+        self.locations = self.world.locations
+        # Descriptions and action menus are rendered once per world too
+        self.renderer = load_renderer(type(self))
+
+        # All of the adventurer's progress lives in a compact state object
+        self.state = GameState(self.world.start_location)
+        self.forge_timer = None  # Fires when the heating forge would burn the blacksmith down
+        self.command_log = None  # Every command and restart with its time, while recording
+        # Held while the state changes, the forge timer changes it from the scheduler thread
+        self.lock = threading.RLock()
+
+        # The forge heat and swords of all live sessions are reported by one process-level set of gauges
+        self.gauges = session_gauges(meter)
+        self.gauges.add(self)
+        self.swords = 0  # Sword flags of the state last reported to the gauges
 
-        self.evil_sword_counter.add(0)  # Initialize the evil sword counter to 0
-
-        self.game_active = True
-        self.current_location = "start"
-        self.is_heating_forge = False
-        self.blacksmith_burned_down = False
-        self.heat = 0  # Track heat at the blacksmith forge
-        self.sword_requested = False  # Track if the blacksmith has been asked to forge a sword
-        self.failed_sword_attempts = 0
-        self.has_sword = False # Track if the sword has been forged
-        self.has_evil_sword = False # Track if the sword has been enchanted by the evil wizard
-        self.has_holy_sword = False # Track if the sword has been enchanted by the chapel priest
-        self.quest_accepted = False # Track if the quest has been accepted
-        self.priest_alive = True
-        self.has_box = False
-        self.current_actions = []  # Add this line to store current available actions
-
-        self.start_heat_forge_thread()
-
-        self.locations = {
-            "start": {
-                "description": "You are at the beginning of your adventure. There's a path leading north towards a town, and another path leading east towards a forest.",
-                "actions": {
-                    "go to town": {"next_location": "town"},
-                    "go to forest": {"next_location": "forest"},
-                    "cheat": {"message": "You cheat and get a sword. You feel guilty", "effect": self.cheat}
-                }
-            },
-            "forest": {
-                "description": "You are in a dark forest. The trees are tall and the air is thick, you can make out a faint trail heading further east.",
-                "actions": {
-                    "go back": {"next_location": "start"},
-                    "go east": {"next_location": "cave"}
-                }
-            },
-            "cave": {
-                "description": "You enter a dark cave at the end of the trail. The air is cold and damp. You see a faint light at the end of the cave.",
-                "actions": {
-                    "go back": {"next_location": "forest"},
-                    "go towards light": {"next_location": "treasure"}
-                }
-            },
-            "treasure": {
-                "description": "You find a treasure chest at the end of the cave. Inside is a small decorative wooden box with no visible way of opening it.",
-                "actions": {
-                    "take the box": {"message": "You take the box and place it in your pocket.", "effect": self.take_box, "pre_requisite": self.box_still_in_chest},
-                    "exit the cave": {"message": "You retrace your steps and go back to where you first started your adventure", "next_location": "start"}
-                }
-            },
-            "blacksmith": {
-                "description": "You are at the blacksmith's forge. The blacksmith is busy working.",
-                "actions": {
-                    "request sword": {
-                        "message": "You ask the blacksmith to forge you a new sword.",
-                        "effect": self.request_sword,
-                        "pre_requisite": self.is_blacksmith_alive
-                    },
-                    "cool forge": {
-                        "message": "You pour water on the forge. The coals sizzle.",
-                        "effect": self.cool_forge,
-                        "pre_requisite": self.is_forge_heating
-                    },
-                    "heat forge": {
-                        "message": "You add more coal to the forge, increasing its heat.",
-                        "effect": self.heat_forge,
-                        "pre_requisite": self.is_sword_requested
-                    },
-                    "check sword": {
-                        "message": "You check if the sword is ready.",
-                        "effect": self.check_sword,
-                        "pre_requisite": self.is_sword_requested
-                    },
-                    "go to town": {"next_location": "town"}
-                },
-                "pre_requisite": self.is_blacksmith_alive
-            },
-            "town": {
-                "description": "You are in a bustling town. People are going about their business. You see a blacksmith, a mysterious man wandering the streets, a quest giver, and a chapel.",
-                "actions": {
-                    "blacksmith": {"next_location": "blacksmith", "pre_requisite": self.is_blacksmith_alive, "effect": self.enter_blacksmith},
-                    "rebuild blacksmith": {"message": "You help the town rebuild the blacksmith.", "effect": self.rebuild_blacksmith, "pre_requisite": self.is_blacksmith_dead},
-                    "mysterious man": {"next_location": "mysterious man", "pre_requisite": self.check_inventory},
-                    "wizard": {"next_location": "wizard", "pre_requisite": self.check_inventory},
-                    "quest giver": {"next_location": "quest"},
-                    "chapel": {"next_location": "chapel"}
-                }
-            },
-            "mysterious man": {
-                "description": "You meet a mysterious man. He offers to enhance your sword with magic.",
-                "actions": {
-                    "accept his offer": {"message": "A great choice indeed. Your sword is now enchanted with great power.", "effect": self.evil_wizard},
-                    "decline his offer": {"message": "You will not get another chance. ACCEPT MY OFFER!"},
-                    "go to town": {"next_location": "town"}
-                }
-            },
-            "wizard": {
-                "description": "You meet a wizard. He yells 'Are you here to kill me?!'",
-                "actions": {
-                    "kill him": {"message": "You attempt to kill the wizard.", "pre_requisite": self.is_quest_accepted, "effect": self.kill_wizard},
-                    "go to town": {"next_location": "town"}
-                }
-            },
-            "quest": {
-                "description": "You meet a quest giver. He offers you a quest to defeat the evil wizard.",
-                "actions": {
-                    "accept quest": {"message": "You tell the quest giver you would like to accept...", "effect": self.quest_giver},
-                    "go to town": {"next_location": "town"}
-                }
-            },
-            "chapel": {
-                "description": "You enter the chapel. The priest greets you warmly.",
-                "actions": {
-                    "look at sword": {"message": "The priest looks at your sword", "effect": self.priest},
-                    "pray": {"message": "You pray for guidance."},
-                    "go to town": {"next_location": "town"}
-                }
-            }
-        }
-    
     def take_box(self):
-        if self.has_box:
+        if self.state.has_box:
             return "You already have the box."
         
-        self.has_box = True
+        self.state.has_box = True
         return "You hear a slight hum coming from the box as you touch it."
 
     def box_still_in_chest(self):
-        return not self.has_box
+        return not self.state.has_box
     
     def enter_blacksmith(self):
-        if self.has_box:
-            logging.info("As you enter the blacksmith you trip over a small stone slab. You feel lighter somehow.")
+        if self.state.has_box:
+            self.log_event(events.STONE_SLAB)
 
     def is_blacksmith_alive(self):
-        return not self.blacksmith_burned_down
+        return not self.state.blacksmith_burned_down
     
     def is_blacksmith_dead(self):
-        return self.blacksmith_burned_down
+        return self.state.blacksmith_burned_down
     
     def rebuild_blacksmith(self):
-        if self.has_box:
-            logging.info("While rebuilding the blacksmith, amongst the ashes you find the burnt remains of the decorative box. Laying beside it is a glowing, unburnt, piece of parchment which reads: 'Congratulations, Adventurer!'. Below it is a long cryptic looking message.")
-            logging.info("U2VuZCB0aGUgcGhyYXNlICJJIGZvdW5kIHRoZSBzZWNyZXQgd2l0aCBvYnNlcnZhYmlsaXR5ISIgdG8gVG9tIEdsZW5uIG9yIEpheSBDbGlmZm9yZCBhdCBodHRwczovL3NsYWNrLmdyYWZhbmEuY29tIGZvciB5b3VyIHJld2FyZC4=")
+        if self.state.has_box:
+            self.log_event(events.BOX_FOUND)
+            self.log_event(events.CRYPTIC_MESSAGE)
         
-        self.blacksmith_burned_down = False
+        self.state.blacksmith_burned_down = False
         self.cool_forge()
         return "You help the town rebuild the blacksmith. The blacksmith is grateful."
     
-    def start_heat_forge_thread(self):
-        def increase_heat_loop():
-            while self.game_active:
-                time.sleep(1)
-                self.increase_heat_periodically()
-        
-        thread = threading.Thread(target=increase_heat_loop)
-        thread.daemon = True
-        thread.start()
+    @property
+    def heat(self):
+        # Heat rises by one every second while the forge is heating, so it is derived from the start time.
+        # The gauges read it from other threads, so the start time is only read once.
+        heat_started_at = self.state.heat_started_at
+        if heat_started_at is not None:
+            return self.state.heat_base + int(self.scheduler.clock() - heat_started_at)
+        return self.state.heat_base
 
     def increase_heat_periodically(self):
-        if self.is_heating_forge:
-            self.heat += 1
-            if self.heat >= 50 and not self.blacksmith_burned_down:
-                self.blacksmith_burned_down = True
-                self.is_heating_forge = False
-    
-    def observe_forge_heat(self, observer):
-        return [metrics.Observation(value=self.heat, attributes={"location": "blacksmith"})]
+        # Bring the forge up to date, burning the blacksmith down once it got too hot.
+        # Called before every command, and through burn_due when the burn deadline is reached.
+        if self.state.is_heating_forge:
+            if self.heat >= FORGE_BURN_HEAT and not self.state.blacksmith_burned_down:
+                # The forge went out when the blacksmith burned down, however late we noticed
+                self.state.blacksmith_burned_down = True
+                self.stop_heating(max(FORGE_BURN_HEAT, self.state.heat_base))
+
+    def start_heating(self):
+        if self.state.is_heating_forge:
+            return
+        self.state.heat_started_at = self.scheduler.clock()
+        self.state.is_heating_forge = True
+        self.schedule_burn()
+
+    def schedule_burn(self):
+        # (Re)arm the timer that burns the blacksmith down if the forge is left heating
+        self.cancel_burn()
+        if self.state.is_heating_forge and not self.state.blacksmith_burned_down:
+            self.forge_timer = self.scheduler.call_at(
+                self.state.heat_started_at + max(FORGE_BURN_HEAT - self.state.heat_base, 0),
+                self.burn_due
+            )
+
+    def burn_due(self):
+        # Runs on the scheduler thread, the turns of the session may be running at the same time
+        with self.lock:
+            self.increase_heat_periodically()
+
+    def cancel_burn(self):
+        if self.forge_timer is not None:
+            self.forge_timer.cancel()
+            self.forge_timer = None
+
+    def stop_heating(self, heat=0):
+        self.cancel_burn()
+        self.state.is_heating_forge = False
+        self.state.heat_started_at = None
+        self.state.heat_base = heat
     
-    def observe_swords(self, observer):
-        sword_count = 0
-        if self.has_sword:
-            sword_count = 1
-        elif self.has_evil_sword or self.has_holy_sword:
-            sword_count = 0
-        # Standard observation - exemplars will be handled automatically by the SDK
-        return [metrics.Observation(value=sword_count, attributes={})]
-    
-    def observe_holy_swords(self, observer):
-        sword_count = 0
-        if self.has_holy_sword:
-            sword_count = 1
-        elif self.has_evil_sword or self.has_sword: 
-            sword_count = 0
-        # Standard observation - exemplars will be handled automatically by the SDK
-        return [metrics.Observation(value=sword_count, attributes={})]
-    
-    def observe_evil_swords(self, observer):
-        sword_count = 0
-        if self.has_evil_sword:
-            sword_count = 1
-        elif self.has_holy_sword or self.has_sword:
-            sword_count = 0
-        # Standard observation - exemplars will be handled automatically by the SDK
-        return [metrics.Observation(value=sword_count, attributes={})]
-
     def cool_forge(self):
-        self.heat = 0
-        self.is_heating_forge = False
+        self.stop_heating()
         return f"You throw a bucket of water over the forge. The coals sizzle and the forge cools down completely."
 
     def heat_forge(self):
-        self.is_heating_forge = True
+        self.start_heating()
         return f"You fire up the forge and it begins heating up. You should wait a while before checking on the sword."
 
     def request_sword(self):
-        if self.has_sword:
+        if self.state.has_sword:
             return "You already have a sword. You don't need another one."
         
-        if self.failed_sword_attempts > 0 and self.failed_sword_attempts < 3:
-            self.sword_requested = True
-            if self.is_heating_forge:
-                logging.warning("You requested another sword, but the forge is still hot!")
+        if self.state.failed_sword_attempts > 0 and self.state.failed_sword_attempts < 3:
+            self.state.sword_requested = True
+            if self.state.is_heating_forge:
+                self.log_event(events.FORGE_STILL_HOT)
             return "The blacksmith looks at you with disappointment. He says, 'Fine, but be more careful this time! If the forge gets too hot, the sword will melt.'"
-        elif self.failed_sword_attempts >= 3:
-            logging.error("The blacksmith refuses to forge you another sword. You have wasted too much of his time.")
+        elif self.state.failed_sword_attempts >= 3:
+            self.log_event(events.SWORD_REFUSED, failed_attempts=self.state.failed_sword_attempts)
+            self.mark_failure("Blacksmith refused to forge another sword")
             return "The blacksmith refuses to forge you another sword. You have wasted too much of his time."
         
-        self.sword_requested = True
+        self.state.sword_requested = True
         return "The blacksmith agrees to forge you a sword. It will take some time and the forge needs to be heated to the correct temperature however."
 
     def is_quest_accepted(self):
-        return self.quest_accepted
+        return self.state.quest_accepted
     
     def is_forge_heating(self):
-        return self.is_heating_forge
+        return self.state.is_heating_forge
     
     def is_sword_requested(self):
-        return self.sword_requested
+        return self.state.sword_requested
     
     def check_inventory(self):
-        return self.has_sword or self.has_holy_sword or self.has_evil_sword
+        return self.state.has_sword or self.state.has_holy_sword or self.state.has_evil_sword
 
     def cheat(self):
-        self.has_sword = True
-        self.sword_counter.add(1)  # Increment sword counter when cheating
+        self.state.has_sword = True
         return "You should continue north you cheater."
     
     def kill_wizard(self):
-        if self.has_holy_sword:
-            self.current_location = "town"
-            self.quest_accepted = False
-            self.game_active = False  # End the game after successfully killing the wizard
-            logging.info(f"{self.adventurer_name} has successfully defeated the wizard.")
+        if self.state.has_holy_sword:
+            self.state.location = "town"
+            self.state.quest_accepted = False
+            self.state.game_active = False  # End the game after successfully killing the wizard
+            self.log_event(events.WIZARD_DEFEATED)
             return "You strike the wizard down with your holy sword. The town cheers for you. Your adventure has come to an end."
 
-        if self.has_evil_sword:
-            self.current_location = "town"
-            self.game_active = False  # End the game if the attempt fails fatally
-            logging.critical("Your sword falters as you try to strike the wizard down. The wizard laughs as you fall to the ground.")
+        if self.state.has_evil_sword:
+            self.state.location = "town"
+            self.state.game_active = False  # End the game if the attempt fails fatally
+            self.log_event(events.CURSED_SWORD_FALTERS)
+            self.mark_failure("Defeated by the wizard with a cursed sword")
             return "The wizard laughs as you strike him down. The sword was cursed. You have failed. The adventure ends here."
 
-        if self.has_sword:
-            self.current_location = "town"
-            logging.warning("Your sword is not powerful enough to defeat the wizard. Your sword shatters, you should probably get a new one.")
-            self.has_sword = False
+        if self.state.has_sword:
+            self.state.location = "town"
+            self.log_event(events.SWORD_SHATTERED)
+            self.state.has_sword = False
             return "You try to strike the wizard down but your sword is not powerful enough."
 
 
     def priest(self):
-        if self.has_holy_sword:
+        if self.state.has_holy_sword:
             return "I have already blessed your sword child, go now and use it well."
         
-        if self.has_sword and not self.has_evil_sword:
-            # Update sword state and adjust counters
-            if self.has_sword:
-                self.sword_counter.add(-1)  # Decrement regular sword
+        if self.state.has_sword and not self.state.has_evil_sword:
+            self.state.has_holy_sword = True
             
-            self.has_holy_sword = True
-            self.holy_sword_counter.add(1)  # Increment holy sword
-            
-            self.has_evil_sword = False
-            self.has_sword = False
+            self.state.has_evil_sword = False
+            self.state.has_sword = False
             
             return "The priest blesses your sword. You feel a warm glow."
         
-        if self.has_evil_sword:
-            # Update sword state and adjust counters
-            self.evil_sword_counter.add(-1)  # Decrement evil sword
-            self.holy_sword_counter.add(1)   # Increment holy sword
-            
-            self.has_evil_sword = False
-            self.has_holy_sword = True
-            self.has_sword = False
-            self.priest_alive = False
-
-            logging.warning("The priest transfers the curse from the sword to himself. He falls to the ground.")
-            logging.warning("The sword is now blessed. You feel a warm glow.")
+        if self.state.has_evil_sword:
+            self.state.has_evil_sword = False
+            self.state.has_holy_sword = True
+            self.state.has_sword = False
+            self.state.priest_alive = False
+
+            self.log_event(events.CURSE_TRANSFERRED)
+            self.log_event(events.SWORD_BLESSED)
             return "The priest looks at your sword with fear. My child, this sword is cursed. I will transfer the curse to me."
         else:
             return "The priest looks at your empty hands. You feel a little embarrassed."
 
     def check_sword(self):
         current_span = trace.get_current_span()
-        if self.heat >= 10 and self.heat <= 20:
-            self.sword_requested = False
-            
-            # Update sword state and increment counter
-            self.has_sword = True
-            self.sword_counter.add(1)  # Increment sword counter
+        heat = self.heat
+        if heat >= 10 and heat <= 20:
+            self.state.sword_requested = False
+            self.state.has_sword = True
             
             current_span.add_event("Sword forged")
             return "The sword is ready. You take it from the blacksmith."
-        elif self.heat >= 21:
-            self.sword_requested = False
-            self.failed_sword_attempts += 1
+        elif heat >= 21:
+            self.state.sword_requested = False
+            self.state.failed_sword_attempts += 1
             current_span.add_event("The sword has completely melted!")
             return "The sword has completely melted! The blacksmith looks at you with disappointment."
         else:
@@ -372,173 +259,390 @@ class AdventureGame:
     
     # Evil wizard scenario
     def evil_wizard(self):
-        # Update sword state and adjust counters
-        if self.has_sword:
-            self.sword_counter.add(-1)       # Decrement regular sword
-        if self.has_holy_sword:
-            self.holy_sword_counter.add(-1)  # Decrement holy sword if had one
-        
-        self.evil_sword_counter.add(1)       # Increment evil sword counter
-        
-        self.has_evil_sword = True  
-        self.has_sword = False
-        self.has_holy_sword = False
+        self.state.has_evil_sword = True  
+        self.state.has_sword = False
+        self.state.has_holy_sword = False
 
-        logging.error("The evil wizard has enchanted your sword with dark magic. You feel a chill run down your spine. This is a warning...")
+        self.log_event(events.SWORD_ENCHANTED)
+        self.mark_failure("Sword enchanted by the evil wizard")
         return "You feel funny but powerful. Maybe I should accept a quest."
     
     def quest_giver(self):
         current_span = trace.get_current_span()
-        if self.has_evil_sword:
+        if self.state.has_evil_sword:
             current_span.add_event("You killed the quest giver with your evil sword!")
-            logging.critical("The sword whispers; I killed them! you will never destroy the wizard with me in your hands! Hahahaha")
-            self.current_location = "town"
+            self.log_event(events.QUEST_GIVER_KILLED)
+            self.mark_failure("Quest giver killed by the evil sword")
+            self.state.location = "town"
             return "The quest giver turns pale. They collapse. Dead! What do I do now?"
-        elif self.has_holy_sword:
-            logging.warning("The sword whispers; I will help you defeat the wizard. I am your only hope.")
-            self.quest_accepted = True
+        elif self.state.has_holy_sword:
+            self.log_event(events.HOLY_SWORD_WHISPERS)
+            self.state.quest_accepted = True
             return "Wow! You have such a powerful sword. I will give you a quest to defeat the evil wizard."
-        elif self.has_sword:
-            self.quest_accepted = True
+        elif self.state.has_sword:
+            self.state.quest_accepted = True
             current_span.add_event("He's not really impressed with your sword.")
-            logging.warning("Ok, if you're sure... But it seems your sword may not be powerful enough to defeat the wizard.")
+            self.log_event(events.WEAK_SWORD)
             return "The quest giver tentatively gives you a quest to defeat the evil wizard."
         else:
             return "You don't have a sword. The quest giver looks at you with disappointment."
 
+    def action_menu(self):
+        """
+        Return the numbered action names for the current location and their rendered list.
+        """
+        location = self.state.location
+        return self.renderer.actions[location], self.renderer.menus[location]
+
     def list_actions(self):
-        actions = list(self.locations[self.current_location].get("actions", {}).keys())
-        actions.append("look around")  # Add the universal 'look around' command
-        
-        # Store the numbered actions for reference in process_command
-        self.current_actions = actions
-        
-        # Create numbered action list
-        numbered_actions = [f"{Colors.MAGENTA}{i+1}. {action}{Colors.RESET}" for i, action in enumerate(actions)]
-        return f"Available actions: {', '.join(numbered_actions)}"
+        return self.action_menu()[1]
 
     def process_command(self, command):
-        if command.lower() in ["quit", "exit"]:
-            self.game_active = False
+        self.increase_heat_periodically()
+        command = normalize_command(command)
+        if command in ("quit", "exit"):
+            self.state.game_active = False
             return "You have ended your adventure."
         
-        if command.lower() in ['look around', 'here']:
+        if command in ("look around", "here"):
             return self.here()
-        elif command.lower() == "list actions":
+        elif command == "list actions":
             return self.list_actions()
         
-        actions = self.locations[self.current_location].get("actions", {})
-        if command.lower() in actions:
-            action = actions[command.lower()]
-            if "pre_requisite" in action and not action["pre_requisite"]():
-                return "You can't do that right now."
-            if "next_location" in action:
-                self.current_location = action["next_location"]
-                if "effect" in action:
-                    action["effect"]()
-                return self.here()
-            elif "message" in action:
-                if "pre_requisite" in action and not action["pre_requisite"]():
-                    return "You can't do that right now."
-                else:
-                    if "effect" in action:
-                        return f"{Colors.GREEN}{action["message"]}\n{action["effect"]()}{Colors.RESET}\n{self.list_actions()}"
-                    else:
-                        return f"{Colors.GREEN}{action["message"]}{Colors.RESET}\n{self.list_actions()}"
-            else:
-                return "You can't do that right now."
+        action = self.locations[self.state.location].dispatch.get(command)
+        if action is None:
+            return UNKNOWN_COMMAND
+        if action.pre_requisite is not None and not action.pre_requisite(self):
+            return NOT_NOW
+        if action.next_location is not None:
+            self.state.location = action.next_location
+            if action.effect is not None:
+                action.effect(self)
+            return self.here()
+        elif action.message is not None:
+            effect = action.effect(self) if action.effect is not None else None
+            return self.renderer.message(self.state.location, action.message, effect)
         else:
-            return "I don't understand that command."
+            return NOT_NOW
 
-    def here(self):
-        output = f"{Colors.GREEN}{self.locations[self.current_location]['description']}{Colors.RESET}\n{self.list_actions()}"
-        return output
+    def command_label(self, location, command):
+        # Free text from players must not become a metric attribute, it would create a series per typo
+        command = normalize_command(command)
+        if command in BUILTIN_COMMANDS or command in self.locations[location].dispatch:
+            return command
+        return "unknown"
 
-    def play(self):
-        # Create a root span for the entire game playthrough
-        
-        print("Welcome to your text adventure! Type 'quit' to exit.")
-        logging.info("Welcome to your text adventure! Type 'quit' to exit.")
-        print(f"{Colors.GREEN}{self.here()}{Colors.RESET}")
-        with self.tracer.start_as_current_span(self.adventurer_name, attributes={"adventurer": self.adventurer_name}) as journey_span:
-            while self.game_active:
-                playerInput = input("> ")
-
-                # Try to resolve the command if it's a number
-                try:
-                    action_index = int(playerInput) - 1
-                    if 0 <= action_index < len(self.current_actions):
-                        command = self.current_actions[action_index]
-                    else:
-                        command = playerInput
-                except ValueError:
-                    command = playerInput
-
-                logging.info(f"Action by {self.adventurer_name}: " + command)
-
-                # Create a span for each action taken by the player, with location attribute added
-                with self.tracer.start_as_current_span(
-                    f"action: {command}",
-                    attributes={
-                        "adventurer": self.adventurer_name,
-                        "location": self.current_location  # Adding location attribute to provide more context
-                    }
-                ) as action_span:
-                    response = self.process_command(command)
-                    print(f"{response}")
-                    logging.info(response)
-
-                    # Check if the game has ended, and if so, break out of the loop
-                    if not self.game_active:
-                        journey_span.add_event("Adventure ended")
-                        action_span.add_event(f"{self.adventurer_name} completed the adventure.")
-                        action_span.set_status(Status(StatusCode.OK))
-                        break
-            
-            # Ask if the user wants to restart after the adventure has ended
-        restart_command = input("Would you like to restart the adventure? (yes/no): ").strip().lower()
-        if restart_command == "yes":
-            self.restart_adventure()
+    def here(self):
+        return self.renderer.places[self.state.location]
+
+    def start_journey(self):
+        # Create a root span for the entire game playthrough, action spans are attached to it
+        self.journey_span = self.tracer.start_span(self.adventurer_name, attributes=self.telemetry.attributes)
+        self.journey_context = trace.set_span_in_context(self.journey_span)
+        self.journey_started_at = self.scheduler.clock()
+        self.log_event(events.JOURNEY_STARTED)
+        self.intro = f"Welcome to your text adventure! Type 'quit' to exit.\n{Colors.GREEN}{self.here()}{Colors.RESET}"
+        return self.intro
+
+    def close(self):
+        with self.lock:
+            self.state.game_active = False
+            self.stop_heating(self.heat)
+            self.release()
+
+    def release(self):
+        # Release everything the session holds outside of itself: the forge timer, the journey span and its gauges
+        with self.lock:
+            self.cancel_burn()
+            self.end_journey()
+            self.gauges.move_swords(self.swords, 0)
+            self.swords = 0
+        self.gauges.discard(self)
+        self.event_log.flush()
+
+    def save(self):
+        """
+        Return the session as bytes that resume turns back into a game, in this or another process.
+        """
+        name = self.adventurer_name.encode()
+        return SAVE_HEADER.pack(SAVE_VERSION, time.time(), len(name)) + name + self.state.to_bytes(self.scheduler.clock())
+
+    @classmethod
+    def resume(cls, data, **kwargs):
+        """
+        Build a game from bytes returned by save. A forge left heating has kept heating since the save.
+
+        :raises: ValueError for data in an unknown format.
+        """
+        version, saved_at, length = SAVE_HEADER.unpack_from(data)
+        if version != SAVE_VERSION:
+            raise ValueError(f"Unsupported saved session format version {version}.")
+        name = bytes(data[SAVE_HEADER.size:SAVE_HEADER.size + length]).decode()
+        game = cls(name, **kwargs)
+        idle = max(time.time() - saved_at, 0)
+        game.restore(GameState.from_bytes(data[SAVE_HEADER.size + length:], game.scheduler.clock() - idle).snapshot())
+        if game.state.game_active:
+            game.start_journey()
         else:
-            print("Thank you for playing!")
-            logging.info(f"{self.adventurer_name}'s adventure has ended.")
-
-    def restart_adventure(self):
-        # Allow the user to restart the adventure with the same name or a new name
-        new_name = input("Enter your name if you'd like to change it, or press Enter to keep the same name: ").strip()
+            game.intro = "Your adventure has ended."
+        return game
+
+    def end_journey(self, outcome="left"):
+        # outcome is completed or failed when the adventure ended, restarted, or left when the session was closed or set aside
+        if self.journey_span is not None:
+            self.gauges.journey_duration.record(self.scheduler.clock() - self.journey_started_at, {"outcome": outcome})
+            self.journey_span.end()
+            self.journey_span = None
+            self.journey_context = None
+
+    def sync_swords(self):
+        # Sword metrics follow the state, the gauges only hear about it when the inventory changed
+        swords = self.state.flags & GameState.SWORD_FLAGS
+        if swords != self.swords:
+            self.gauges.move_swords(self.swords, swords)
+            self.swords = swords
+
+    def mark_failure(self, description):
+        # Errors and criticals fail the current action span, so traces with them are always kept
+        self.turn_status = Status(StatusCode.ERROR, description)
+
+    def resolve_command(self, player_input):
+        # Try to resolve the command if it's a number from the action menu
+        command = player_input.strip()
+        if command.isdecimal():
+            actions = self.action_menu()[0]
+            action_index = int(command) - 1
+            if 0 <= action_index < len(actions):
+                command = actions[action_index]
+        if self.command_log is not None:
+            self.command_log.record(self.scheduler.clock(), player_input)
+        return command
+
+    def apply_command(self, command):
+        # Process a command, timing it and bringing the sword metrics up to date
+        self.turn_status = None
+        location = self.state.location
+        start = time.perf_counter()
+        with self.lock:
+            response = self.process_command(command)
+            self.sync_swords()
+        self.gauges.command_duration.record(
+            (time.perf_counter() - start) * 1000,
+            {"location": location, "action": self.command_label(location, command)}
+        )
+        return response
+
+    def outcome(self, response):
+        # What came of the last command, for the action events
+        if self.turn_status is not None:
+            return "failed"
+        if not self.state.game_active:
+            return "ended"
+        if response == UNKNOWN_COMMAND:
+            return "unknown"
+        if response == NOT_NOW:
+            return "refused"
+        return "ok"
+
+    def log_event(self, event, **attributes):
+        # Events are logged where the adventurer is, unless told otherwise
+        self.event_log.emit(event, **{"location": self.state.location, **attributes})
+
+    def journey_links(self, context):
+        # Actions continuing a client's trace are linked to the journey instead of nested in it
+        if context is not None and self.journey_span is not None:
+            return [trace.Link(self.journey_span.get_span_context())]
+        return None
+
+    def take_turn(self, player_input, context=None):
+        command = self.resolve_command(player_input)
+        location = self.state.location
+
+        # Create a span for each action taken by the player, with location attribute added
+        with self.tracer.start_as_current_span(
+            f"action: {command}",
+            context=context or self.journey_context,
+            links=self.journey_links(context),
+            attributes={
+                **self.telemetry.attributes,
+                "location": self.state.location  # Adding location attribute to provide more context
+            }
+        ) as action_span:
+            response = self.apply_command(command)
+            if self.turn_status is not None:
+                action_span.set_status(self.turn_status)
+            self.log_event(events.ACTION, location=location, action=self.command_label(location, command),
+                           outcome=self.outcome(response))
+
+            # Check if the game has ended, and if so, close the journey
+            if not self.state.game_active:
+                if self.journey_span is not None:
+                    self.journey_span.add_event("Adventure ended")
+                action_span.add_event(f"{self.adventurer_name} completed the adventure.")
+                if self.turn_status is None:
+                    action_span.set_status(Status(StatusCode.OK))
+
+        if not self.state.game_active:
+            self.end_journey("completed" if self.turn_status is None else "failed")
+        return response
+
+    def take_turns(self, player_inputs, stop_on_failure=False, context=None):
+        """
+        Apply commands in order and return their responses. The whole batch is a single span with
+        an event per command and is logged once, which is much cheaper than a turn per command for
+        scripted players. The batch stops when the adventure ends, and with stop_on_failure also
+        after the first command that was not understood, could not be done or failed.
+        """
+        commands = []
+        responses = []
+        status = None
+        with self.tracer.start_as_current_span(
+            "actions",
+            context=context or self.journey_context,
+            links=self.journey_links(context),
+            attributes={**self.telemetry.attributes, "location": self.state.location}
+        ) as batch_span:
+            for player_input in player_inputs:
+                if not self.state.game_active:
+                    break
+                command = self.resolve_command(player_input)
+                location = self.state.location
+                response = self.apply_command(command)
+                commands.append(self.command_label(location, command))
+                responses.append(response)
+
+                attributes = {"command": command, "location": location}
+                if self.turn_status is not None:
+                    attributes["error"] = self.turn_status.description
+                    status = status or self.turn_status
+                batch_span.add_event("action", attributes)
+                if stop_on_failure and (self.turn_status is not None or response in (UNKNOWN_COMMAND, NOT_NOW)):
+                    break
+
+            batch_span.set_attribute("batch.size", len(commands))
+            if status is not None:
+                batch_span.set_status(status)
+            if commands:
+                self.log_event(events.ACTIONS, actions=", ".join(commands), outcome=self.outcome(responses[-1]))
+
+            if not self.state.game_active:
+                if self.journey_span is not None:
+                    self.journey_span.add_event("Adventure ended")
+                batch_span.add_event(f"{self.adventurer_name} completed the adventure.")
+                if status is None:
+                    batch_span.set_status(Status(StatusCode.OK))
+
+        if not self.state.game_active:
+            self.end_journey("completed" if status is None else "failed")
+        return responses
+
+    def start_recording(self):
+        """
+        Record the commands of the session from now on, so it can be replayed in a simulation.
+        A session that has already made progress, such as a resumed one, records where it starts from.
+        """
+        from simulation import CommandLog
+
+        now = self.scheduler.clock()
+        state = None
+        if self.state != GameState(self.world.start_location):
+            state = self.state.to_bytes(now)
+        self.command_log = CommandLog(self.adventurer_name, now, state=state)
+        return self.command_log
+
+    def snapshot(self):
+        return self.state.snapshot()
+
+    def restore(self, snapshot):
+        # Restoring is a single copy, only the forge timer and sword metrics have to follow the new state
+        with self.lock:
+            self.state.restore(snapshot)
+            self.schedule_burn()
+            self.sync_swords()
+
+    def restart_adventure(self, new_name=None):
+        # Allow the adventurer to restart with the same name or a new name
+        self.end_journey("restarted")
+        if self.command_log is not None:
+            self.command_log.record_restart(self.scheduler.clock(), new_name)
         if new_name:
             self.adventurer_name = new_name
-        
-        if self.has_sword:
-            self.sword_counter.add(-1)
-        if self.has_holy_sword:
-            self.holy_sword_counter.add(-1)
-        if self.has_evil_sword:
-            self.evil_sword_counter.add(-1)
-
+            self.telemetry.rename(new_name)
 
         # Reset all game state variables
-        self.game_active = True
-        self.current_location = "start"
-        self.is_heating_forge = False
-        self.blacksmith_burned_down = False
-        self.sword_requested = False
-        self.failed_sword_attempts = 0
-        self.has_sword = False
-        self.has_evil_sword = False
-        self.has_holy_sword = False
-        self.quest_accepted = False
-        self.priest_alive = True
-        self.heat = 0  # Reset the forge heat
-        self.has_box = False
-
-    # Restart the heat forge thread
-        self.start_heat_forge_thread()
-
-        # Start the game again
-        self.play()
+        with self.lock:
+            self.stop_heating()
+            self.state.reset(self.world.start_location)
+            self.sync_swords()
+
+async def play(resume=None, record=None):
+    # The terminal is just another client of the engine, reading input off the event loop
+    loop = asyncio.get_running_loop()
+    # Everything printed for a turn is written at once, right before asking for the next command
+    output = OutputWriter()
+
+    async def prompt(text):
+        output.flush()
+        return await loop.run_in_executor(None, input, text)
+
+    engine = GameEngine(AdventureGame, store=SessionStore.from_env(), record=record is not None)
+    if resume is None:
+        adventurer_name = await prompt("Enter your name, brave adventurer: ")
+        session_id = engine.create_session(adventurer_name)
+    else:
+        session_id = resume
+    output.write(engine.welcome(session_id))
+
+    try:
+        while True:
+            while engine.is_active(session_id):
+                response = await engine.submit(session_id, await prompt("> "))
+                output.write(response)
 
-if __name__ == "__main__":
-    game = AdventureGame()
-    game.play()
+            # Ask if the user wants to restart after the adventure has ended
+            restart_command = (await prompt("Would you like to restart the adventure? (yes/no): ")).strip().lower()
+            if restart_command != "yes":
+                break
+            new_name = (await prompt("Enter your name if you'd like to change it, or press Enter to keep the same name: ")).strip()
+            output.write(engine.restart_session(session_id, new_name))
+    except EOFError:
+        # End of input saves the journey for later when sessions are persisted
+        if engine.store is None:
+            raise
+        engine.suspend_all()
+        output.write(f"\nYour journey was saved. Continue it with: python main.py --resume {session_id}")
+        output.flush()
+        return
+
+    output.write("Thank you for playing!")
+    output.flush()
+    command_log = engine.get_session(session_id).command_log if record is not None else None
+    if command_log is not None:
+        with open(record, "w") as f:
+            command_log.dump(f)
+    engine.close_session(session_id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play the text adventure.")
+    parser.add_argument("--no-telemetry", action="store_true",
+                        help="Play without recording or exporting telemetry, same as OTEL_SDK_DISABLED=true")
+    parser.add_argument("--resume", metavar="SESSION_ID", default=None,
+                        help="Continue a journey saved to the ADVENTURE_SESSION_STORE database")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="Write the commands of the journey to PATH, to replay it with simulation.py --replay")
+    args = parser.parse_args()
+    if args.resume is not None:
+        if "ADVENTURE_SESSION_STORE" not in os.environ:
+            parser.error("--resume needs ADVENTURE_SESSION_STORE to point at the session store.")
+        store = SessionStore.from_env()
+        try:
+            if args.resume not in store:
+                parser.error(f"There is no saved journey {args.resume} in {store.path}.")
+        finally:
+            store.close()
+    if args.no_telemetry:
+        get_telemetry(SERVICE_NAME, enabled=False)
+    asyncio.run(play(args.resume, args.record))
 
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
 from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
 
 # Import BatchLogRecordProcessor to handle batches of log records before export.
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor, LogExporter, LogExportResult
 
 # Import the Resource class to associate resources such as service name and instance ID with metrics, logs, and traces.
 from opentelemetry.sdk.resources import Resource
@@ -18,69 +18,672 @@ import logging
 
 # Import metrics-related modules for managing and exporting metrics with OpenTelemetry.
 from opentelemetry import metrics
-from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics import Counter, Histogram, MeterProvider, ObservableCounter
+from opentelemetry.sdk.metrics.view import ExponentialBucketHistogramAggregation, View
 from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.metrics.export import AggregationTemporality, PeriodicExportingMetricReader
 
 # Import tracing-related modules for setting up and managing traces.
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.sdk.trace.sampling import TraceIdRatioBased
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import (
+    ALWAYS_OFF, ALWAYS_ON, Decision, ParentBased, Sampler, SamplingResult, TraceIdRatioBased
+)
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
 
 # Import exemplar-related classes from OpenTelemetry SDK
 from opentelemetry.sdk.metrics import TraceBasedExemplarFilter
 
+# Import the compression setting and header parsing shared by the OTLP exporters.
+from opentelemetry.exporter.otlp.proto.http import Compression
+from opentelemetry.util.re import parse_env_headers
+import requests
+
+from telemetry import SessionTelemetry
+from spool import RingSpool, SpoolingLogExporter, SpoolingMetricExporter, SpoolingSender, SpoolingSpanExporter
+
+from collections import OrderedDict
 import os
-# Interval in seconds for exporting metrics periodically.
-INTERVAL_SEC = 10
+import socket
+import threading
+import time
+# Interval in milliseconds for exporting metrics periodically.
+DEFAULT_METRIC_EXPORT_INTERVAL_MS = 10000
+
+# Buckets of the exponential histograms, more buckets keep a finer resolution over a wider range
+DEFAULT_HISTOGRAM_MAX_BUCKETS = 160
+
+# Temporality of the metrics pushed over OTLP. Delta sends only what changed since the last
+# export, lowmemory does so for counters and histograms only, as the SDK defines it.
+METRIC_TEMPORALITIES = {
+    "cumulative": {},
+    "delta": {
+        Counter: AggregationTemporality.DELTA,
+        ObservableCounter: AggregationTemporality.DELTA,
+        Histogram: AggregationTemporality.DELTA,
+    },
+    "lowmemory": {
+        Counter: AggregationTemporality.DELTA,
+        Histogram: AggregationTemporality.DELTA,
+    },
+}
+
+# Attributes kept on the metrics recorded per command or journey, any other attribute is dropped
+# before aggregation so it cannot multiply the series. ADVENTURE_METRIC_ATTRIBUTES overrides them.
+DEFAULT_METRIC_ATTRIBUTES = {
+    "command_duration": ("location", "action"),
+    "journey_duration": ("outcome",),
+}
+
+
+class TelemetryConfig:
+    """
+    TelemetryConfig holds the exporter settings shared by the trace, metric and log pipelines.
+
+    Settings come from the standard OTEL_EXPORTER_OTLP_* variables. The protocol is either
+    "http/protobuf" or "grpc", exports are gzip compressed by default, and the HTTP exporters
+    of each signal keep their own connection pool.
+
+    With a spool path set, the HTTP exporters write batches they cannot deliver to a disk-backed
+    ring file of spool_size bytes and replay them in the background once the collector recovers.
+
+    Metrics are pushed every metric_export_interval milliseconds with the metric_temporality
+    of METRIC_TEMPORALITIES, and metric_attributes lists the attributes each metric keeps.
+    """
+    PROTOCOLS = ("http/protobuf", "grpc")
+    SIGNALS = ("traces", "metrics", "logs")
+
+    def __init__(self, protocol="http/protobuf", endpoint=None, headers=None, compression="gzip", timeout=10,
+                 spool_path=None, spool_size=64 * 1024 * 1024, metrics_port=None,
+                 metric_export_interval=DEFAULT_METRIC_EXPORT_INTERVAL_MS, metric_temporality="cumulative",
+                 metric_attributes=None, histogram_max_buckets=DEFAULT_HISTOGRAM_MAX_BUCKETS):
+        if protocol not in self.PROTOCOLS:
+            raise ValueError(f"Unsupported OTLP protocol '{protocol}', use one of {', '.join(self.PROTOCOLS)}.")
+        if compression not in ("gzip", "none"):
+            raise ValueError(f"Unsupported OTLP compression '{compression}', use gzip or none.")
+        if spool_path and protocol == "grpc":
+            raise ValueError("The telemetry spool only supports the http/protobuf protocol.")
+        if metric_temporality not in METRIC_TEMPORALITIES:
+            raise ValueError(f"Unsupported metric temporality '{metric_temporality}', use one of {', '.join(METRIC_TEMPORALITIES)}.")
+        self.protocol = protocol
+        if endpoint is None:
+            # In the docker compose setup the collector is alloy, which listens on 4318 for HTTP and 4317 for gRPC
+            host = "alloy" if os.environ.get("SETUP") == "docker" else "localhost"
+            endpoint = f"http://{host}:{4317 if protocol == 'grpc' else 4318}"
+        self.endpoint = endpoint.rstrip("/")
+        self.headers = headers or {}
+        self.compression = compression
+        self.timeout = timeout
+        self.spool_path = spool_path
+        self.spool_size = spool_size
+        # Serve metrics for Prometheus to pull on this port, next to pushing them over OTLP
+        self.metrics_port = metrics_port
+        self.metric_export_interval = metric_export_interval
+        self.metric_temporality = metric_temporality
+        self.metric_attributes = DEFAULT_METRIC_ATTRIBUTES if metric_attributes is None else metric_attributes
+        self.histogram_max_buckets = histogram_max_buckets
+        self._spool_sender = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            protocol=os.environ.get("OTEL_EXPORTER_OTLP_PROTOCOL", "http/protobuf").strip().lower(),
+            endpoint=os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT") or None,
+            headers=parse_env_headers(os.environ.get("OTEL_EXPORTER_OTLP_HEADERS", ""), liberal=True),
+            compression=os.environ.get("OTEL_EXPORTER_OTLP_COMPRESSION", "gzip").strip().lower(),
+            timeout=int(os.environ.get("OTEL_EXPORTER_OTLP_TIMEOUT", 10)),
+            spool_path=os.environ.get("ADVENTURE_SPOOL_PATH") or None,
+            spool_size=int(os.environ.get("ADVENTURE_SPOOL_SIZE_MB", 64)) * 1024 * 1024,
+            metrics_port=int(os.environ["ADVENTURE_METRICS_PORT"]) if os.environ.get("ADVENTURE_METRICS_PORT") else None,
+            metric_export_interval=int(os.environ.get("OTEL_METRIC_EXPORT_INTERVAL", DEFAULT_METRIC_EXPORT_INTERVAL_MS)),
+            metric_temporality=os.environ.get("OTEL_EXPORTER_OTLP_METRICS_TEMPORALITY_PREFERENCE", "cumulative").strip().lower(),
+            metric_attributes=parse_metric_attributes(os.environ.get("ADVENTURE_METRIC_ATTRIBUTES", "")),
+            histogram_max_buckets=int(os.environ.get("ADVENTURE_HISTOGRAM_MAX_BUCKETS", DEFAULT_HISTOGRAM_MAX_BUCKETS)),
+        )
+
+    def signal_endpoint(self, signal):
+        """
+        Return the endpoint for a signal, honouring OTEL_EXPORTER_OTLP_<SIGNAL>_ENDPOINT.
+        """
+        endpoint = os.environ.get(f"OTEL_EXPORTER_OTLP_{signal.upper()}_ENDPOINT")
+        if endpoint:
+            return endpoint
+        if self.protocol == "grpc":
+            return self.endpoint
+        return f"{self.endpoint}/v1/{signal}"
+
+    def new_session(self):
+        # Every exporter gets its own HTTP session, they export from their own threads and
+        # requests.Session is not guaranteed to be thread-safe. Each keeps its connections alive.
+        return requests.Session()
+
+    @property
+    def spool_sender(self):
+        # One spool for all signals, replayed in the order the batches were written
+        if self._spool_sender is None:
+            self._spool_sender = SpoolingSender(self, RingSpool(self.spool_path, self.spool_size))
+        return self._spool_sender
+
+    def _exporter_kwargs(self, signal):
+        kwargs = {"endpoint": self.signal_endpoint(signal), "headers": self.headers, "timeout": self.timeout}
+        if self.protocol == "grpc":
+            import grpc
+            kwargs["compression"] = grpc.Compression.Gzip if self.compression == "gzip" else grpc.Compression.NoCompression
+        else:
+            kwargs["compression"] = Compression.Gzip if self.compression == "gzip" else Compression.NoCompression
+            kwargs["session"] = self.new_session()
+        return kwargs
+
+    def span_exporter(self):
+        if self.spool_path:
+            return SpoolingSpanExporter(self.spool_sender)
+        if self.protocol == "grpc":
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter as GrpcSpanExporter
+            return GrpcSpanExporter(**self._exporter_kwargs("traces"))
+        return OTLPSpanExporter(**self._exporter_kwargs("traces"))
+
+    def metric_exporter(self):
+        # Histograms are pushed with exponential buckets, which follow latencies over any range
+        # without choosing bucket boundaries up front
+        preferences = {
+            "preferred_aggregation": {Histogram: ExponentialBucketHistogramAggregation(max_size=self.histogram_max_buckets)},
+            "preferred_temporality": METRIC_TEMPORALITIES[self.metric_temporality],
+        }
+        if self.spool_path:
+            return SpoolingMetricExporter(self.spool_sender, **preferences)
+        if self.protocol == "grpc":
+            from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter as GrpcMetricExporter
+            return GrpcMetricExporter(**self._exporter_kwargs("metrics"), **preferences)
+        return OTLPMetricExporter(**self._exporter_kwargs("metrics"), **preferences)
+
+    def metric_views(self):
+        """
+        Return the views keeping only the allowed attributes of each metric listed in metric_attributes.
+
+        The views leave the aggregation to the readers: the OTLP exporter asks for exponential
+        histograms, while the Prometheus reader, which cannot serve them, keeps explicit buckets.
+        """
+        return [View(instrument_name=name, attribute_keys=set(keys)) for name, keys in self.metric_attributes.items()]
+
+    def pull_metric_reader(self):
+        """
+        Return a metric reader serving metrics on metrics_port for Prometheus to scrape, or None when it is not set.
+
+        :raises: RuntimeError when the optional opentelemetry-exporter-prometheus package is not installed.
+        """
+        if self.metrics_port is None:
+            return None
+        try:
+            from opentelemetry.exporter.prometheus import PrometheusMetricReader
+            from prometheus_client import start_http_server
+        except ImportError:
+            raise RuntimeError("Serving metrics on ADVENTURE_METRICS_PORT needs the opentelemetry-exporter-prometheus package.") from None
+        start_http_server(self.metrics_port)
+        return PrometheusMetricReader()
+
+    def log_exporter(self):
+        if self.spool_path:
+            return SpoolingLogExporter(self.spool_sender)
+        if self.protocol == "grpc":
+            from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter as GrpcLogExporter
+            return GrpcLogExporter(**self._exporter_kwargs("logs"))
+        return OTLPLogExporter(**self._exporter_kwargs("logs"))
+
+
+def parse_metric_attributes(value):
+    """
+    Parse metric attribute allow-lists such as "command_duration=location,action;journey_duration=",
+    on top of DEFAULT_METRIC_ATTRIBUTES. A metric with no attributes listed keeps none.
+
+    :raises: ValueError for entries without an instrument name.
+    """
+    attributes = dict(DEFAULT_METRIC_ATTRIBUTES)
+    for entry in filter(None, (entry.strip() for entry in value.split(";"))):
+        name, _, keys = entry.partition("=")
+        if not name.strip():
+            raise ValueError(f"Metric attribute entry without an instrument name: '{entry}'.")
+        attributes[name.strip()] = tuple(key.strip() for key in keys.split(",") if key.strip())
+    return attributes
+
+
+# Batching profiles for log export, picked with ADVENTURE_LOG_BATCH_PROFILE. The standard
+# OTEL_BLRP_* variables override single settings of the chosen profile.
+LOG_BATCH_PROFILES = {
+    # Few, large requests for many concurrent sessions
+    "throughput": {
+        "max_queue_size": 8192,
+        "max_export_batch_size": 512,
+        "schedule_delay_millis": 1000,
+        "export_timeout_millis": 10000,
+    },
+    # Logs show up in Loki quickly while a single player is watching the dashboards
+    "low_latency": {
+        "max_queue_size": 2048,
+        "max_export_batch_size": 64,
+        "schedule_delay_millis": 200,
+        "export_timeout_millis": 5000,
+    },
+}
+DEFAULT_LOG_BATCH_PROFILE = "throughput"
+
+_LOG_BATCH_ENV = {
+    "max_queue_size": "OTEL_BLRP_MAX_QUEUE_SIZE",
+    "max_export_batch_size": "OTEL_BLRP_MAX_EXPORT_BATCH_SIZE",
+    "schedule_delay_millis": "OTEL_BLRP_SCHEDULE_DELAY",
+    "export_timeout_millis": "OTEL_BLRP_EXPORT_TIMEOUT",
+}
+
+
+def log_batch_settings(profile=None):
+    """
+    Return the BatchLogRecordProcessor settings for a profile, with OTEL_BLRP_* overrides applied.
+
+    :raises: ValueError for unknown profiles.
+    """
+    profile = profile or os.environ.get("ADVENTURE_LOG_BATCH_PROFILE", DEFAULT_LOG_BATCH_PROFILE)
+    if profile not in LOG_BATCH_PROFILES:
+        raise ValueError(f"Unknown log batch profile '{profile}'.")
+    settings = dict(LOG_BATCH_PROFILES[profile])
+    for setting, variable in _LOG_BATCH_ENV.items():
+        if os.environ.get(variable):
+            settings[setting] = int(os.environ[variable])
+    return settings
+
+
+class TimedExporter:
+    """
+    Mixin for exporters wrapping another one, counting exported and failed items and reporting how long each export took.
+    """
+    SUCCESS = None
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.exported = 0
+        self.failed = 0
+        # Called with the export duration in seconds, set once metrics are available
+        self.on_export = None
+
+    def export(self, batch):
+        start = time.perf_counter()
+        result = self.exporter.export(batch)
+        duration = time.perf_counter() - start
+        if result is self.SUCCESS:
+            self.exported += len(batch)
+        else:
+            self.failed += len(batch)
+        if self.on_export is not None:
+            self.on_export(duration)
+        return result
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+
+class TimedLogExporter(TimedExporter, LogExporter):
+    SUCCESS = LogExportResult.SUCCESS
+
+
+class TimedSpanExporter(TimedExporter, SpanExporter):
+    SUCCESS = SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis=30000):
+        return self.exporter.force_flush(timeout_millis)
+
+
+def register_pipeline_metrics(meter, processor, prefix, items):
+    """
+    Report the queue depth, dropped and exported items, and export latency of a batching processor.
+    The processor needs queue_depth, dropped and a TimedExporter as timed_exporter.
+
+    :param prefix: Prefix of the queue and export metric names, such as "log".
+    :param items: Prefix of the item count metric names, such as "log_records".
+    """
+    meter.create_observable_gauge(
+        name=f"{prefix}_queue_depth",
+        description=f"{prefix.capitalize()} items waiting to be exported",
+        callbacks=[lambda options: [metrics.Observation(processor.queue_depth)]]
+    )
+    meter.create_observable_counter(
+        name=f"{items}_dropped",
+        description="Items dropped because the export queue was full",
+        callbacks=[lambda options: [metrics.Observation(processor.dropped)]]
+    )
+    meter.create_observable_counter(
+        name=f"{items}_exported",
+        description="Items exported, by result",
+        callbacks=[lambda options: [
+            metrics.Observation(processor.timed_exporter.exported, {"result": "success"}),
+            metrics.Observation(processor.timed_exporter.failed, {"result": "failure"}),
+        ]]
+    )
+    export_duration = meter.create_histogram(
+        name=f"{prefix}_export_duration",
+        unit="ms",
+        description="Time taken by each export request"
+    )
+    processor.timed_exporter.on_export = lambda duration: export_duration.record(duration * 1000)
+
+
+class InstrumentedBatchLogRecordProcessor(BatchLogRecordProcessor):
+    """
+    BatchLogRecordProcessor that keeps track of its queue depth and of the records it drops
+    because the queue is full, so both can be reported as metrics.
+    """
+    def __init__(self, exporter, **settings):
+        self.timed_exporter = TimedLogExporter(exporter)
+        self.dropped = 0
+        super().__init__(self.timed_exporter, **settings)
+
+    def emit(self, log_data):
+        # The queue is a bounded deque, appending to a full one silently drops the oldest record
+        if len(self._queue) >= self._max_queue_size:
+            self.dropped += 1
+        super().emit(log_data)
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def register_metrics(self, meter):
+        """
+        Report queue depth, dropped and exported records, and export latency through the given meter.
+        """
+        register_pipeline_metrics(meter, self, "log", "log_records")
+
+
+class InstrumentedBatchSpanProcessor(BatchSpanProcessor):
+    """
+    BatchSpanProcessor that keeps track of its queue depth and of the spans it drops because the queue is full.
+    """
+    def __init__(self, exporter, **settings):
+        self.timed_exporter = TimedSpanExporter(exporter)
+        self.dropped = 0
+        super().__init__(self.timed_exporter, **settings)
+
+    def on_end(self, span):
+        # Like the log queue, a full span queue drops the oldest span; unsampled spans never get queued
+        if span.context.trace_flags.sampled and len(self.queue) >= self.max_queue_size:
+            self.dropped += 1
+        super().on_end(span)
+
+    @property
+    def queue_depth(self):
+        return len(self.queue)
+
+    def register_metrics(self, meter):
+        """
+        Report queue depth, dropped and exported spans, and export latency through the given meter.
+        """
+        register_pipeline_metrics(meter, self, "span", "spans")
+
+
+class RateLimitingSampler(Sampler):
+    """
+    Samples at most traces_per_sec new traces per second, using a token bucket so short bursts are smoothed out.
+    """
+    def __init__(self, traces_per_sec):
+        self.traces_per_sec = float(traces_per_sec)
+        self._tokens = self.traces_per_sec
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.traces_per_sec, self._tokens + (now - self._last) * self.traces_per_sec)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes, self._trace_state(parent_context))
+        return SamplingResult(Decision.DROP, None, self._trace_state(parent_context))
+
+    @staticmethod
+    def _trace_state(parent_context):
+        # Like the SDK samplers, keep the trace state of the parent
+        return trace.get_current_span(parent_context).get_span_context().trace_state
+
+    def get_description(self):
+        return f"RateLimitingSampler{{{self.traces_per_sec}}}"
+
+
+class KeepInterestingSampler(Sampler):
+    """
+    Wraps another sampler so that spans it drops are still recorded locally, but not sampled.
+    Together with InterestingTraceSpanProcessor this keeps every trace that turns out to contain an error.
+    """
+    def __init__(self, sampler):
+        self.sampler = sampler
+
+    def should_sample(self, parent_context, trace_id, name, kind=None, attributes=None, links=None, trace_state=None):
+        result = self.sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision is Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, attributes, result.trace_state)
+        return result
+
+    def get_description(self):
+        return f"KeepInterestingSampler{{{self.sampler.get_description()}}}"
+
+
+class InterestingTraceSpanProcessor(SpanProcessor):
+    """
+    Passes sampled spans straight on and holds on to recorded-only spans until their root span ends.
+    If any span of the trace ended with an error status the whole trace is forwarded as sampled,
+    otherwise it is dropped.
+
+    Memory is bounded by max_buffered spans held in total, in at most max_traces pending traces
+    of at most max_spans spans each. When a bound is reached the oldest pending traces are
+    evicted, and counted in evicted_traces and evicted_spans.
+    """
+    def __init__(self, processor, max_traces=10000, max_spans=512, max_buffered=65536):
+        self.processor = processor
+        self.max_traces = max_traces
+        self.max_spans = max_spans
+        self.max_buffered = max_buffered
+        # trace id -> [spans, keep]
+        self._pending = OrderedDict()
+        self._buffered = 0
+        self.evicted_traces = 0
+        self.evicted_spans = 0
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context=None):
+        self.processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span):
+        if span.context.trace_flags.sampled:
+            self.processor.on_end(span)
+            return
+
+        trace_id = span.context.trace_id
+        with self._lock:
+            pending = self._pending.get(trace_id)
+            if pending is None:
+                pending = self._pending[trace_id] = [[], False]
+            if len(pending[0]) < self.max_spans:
+                pending[0].append(span)
+                self._buffered += 1
+            if span.status.status_code is StatusCode.ERROR:
+                pending[1] = True
+            if span.parent is not None and not span.parent.is_remote:
+                self._evict()
+                return
+            # The local root ended, the trace is complete, unless it was evicted while pending
+            spans, keep = self._pending.pop(trace_id, ([], False))
+            self._buffered -= len(spans)
+
+        if keep:
+            for kept in spans:
+                self.processor.on_end(self._as_sampled(kept))
+
+    def _evict(self):
+        # Must be called with the lock held. Drops the oldest pending traces until within bounds.
+        while len(self._pending) > self.max_traces or self._buffered > self.max_buffered:
+            _, (spans, _) = self._pending.popitem(last=False)
+            self._buffered -= len(spans)
+            self.evicted_traces += 1
+            self.evicted_spans += len(spans)
+
+    @property
+    def buffered(self):
+        return self._buffered
+
+    def register_metrics(self, meter):
+        """
+        Report the spans held back and the pending traces evicted to stay within bounds.
+        """
+        meter.create_observable_gauge(
+            name="interesting_spans_buffered",
+            description="Recorded-only spans held until their trace ends",
+            callbacks=[lambda options: [metrics.Observation(self.buffered)]]
+        )
+        meter.create_observable_counter(
+            name="interesting_traces_evicted",
+            description="Pending traces dropped before they ended to bound memory",
+            callbacks=[lambda options: [metrics.Observation(self.evicted_traces)]]
+        )
+        meter.create_observable_counter(
+            name="interesting_spans_evicted",
+            description="Spans of the pending traces dropped before they ended",
+            callbacks=[lambda options: [metrics.Observation(self.evicted_spans)]]
+        )
+
+    @staticmethod
+    def _as_sampled(span):
+        context = span.context
+        return ReadableSpan(
+            name=span.name,
+            context=SpanContext(
+                context.trace_id, context.span_id, context.is_remote,
+                TraceFlags(context.trace_flags | TraceFlags.SAMPLED), context.trace_state
+            ),
+            parent=span.parent,
+            resource=span.resource,
+            attributes=span.attributes,
+            events=span.events,
+            links=span.links,
+            kind=span.kind,
+            status=span.status,
+            start_time=span.start_time,
+            end_time=span.end_time,
+            instrumentation_scope=span.instrumentation_scope,
+        )
+
+    def shutdown(self):
+        self.processor.shutdown()
+
+    def force_flush(self, timeout_millis=30000):
+        return self.processor.force_flush(timeout_millis)
+
+
+def create_sampler(name, arg=None):
+    """
+    Build a sampler from an OTEL_TRACES_SAMPLER style name. On top of the standard samplers,
+    "ratelimited" and "parentbased_ratelimited" cap new traces at arg traces per second.
+
+    :raises: ValueError for unknown sampler names.
+    """
+    name = name.strip().lower()
+    parent_based = name.startswith("parentbased_")
+    root_name = name[len("parentbased_"):] if parent_based else name
+    if root_name == "always_on":
+        root = ALWAYS_ON
+    elif root_name == "always_off":
+        root = ALWAYS_OFF
+    elif root_name == "traceidratio":
+        root = TraceIdRatioBased(float(arg) if arg not in (None, "") else 1.0)
+    elif root_name == "ratelimited":
+        root = RateLimitingSampler(float(arg) if arg not in (None, "") else 100.0)
+    else:
+        raise ValueError(f"Unknown trace sampler '{name}'.")
+    return ParentBased(root) if parent_based else root
+
+
+def sampler_from_env():
+    """
+    Read the sampler from OTEL_TRACES_SAMPLER and OTEL_TRACES_SAMPLER_ARG. Every trace is sampled by default.
+    ADVENTURE_TRACES_KEEP_INTERESTING=true additionally keeps traces with errors whatever the sampler decided.
+    """
+    sampler = create_sampler(
+        os.environ.get("OTEL_TRACES_SAMPLER", "parentbased_traceidratio"),
+        os.environ.get("OTEL_TRACES_SAMPLER_ARG", "1.0")
+    )
+    if os.environ.get("ADVENTURE_TRACES_KEEP_INTERESTING", "").strip().lower() in ("1", "true", "yes"):
+        sampler = KeepInterestingSampler(sampler)
+    return sampler
+
+
+def default_instance_id():
+    """
+    Derive a service.instance.id that is unique per running process: ADVENTURE_INSTANCE_ID if set,
+    otherwise the host name (the container id under docker) and the process id.
+    """
+    return os.environ.get("ADVENTURE_INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def create_resource(service_name, instance_id=None):
+    return Resource.create({"service.name": service_name, "service.instance.id": instance_id or default_instance_id()})
 
 
 class CustomTracer:
-    def __init__(self, service_name):
+    def __init__(self, service_name, exporter=None, sampler=None, config=None, resource=None):
         # Set up TracerProvider only once globally
-        if os.environ.get("SETUP") == "docker":
-            exporter = OTLPSpanExporter(endpoint="http://alloy:4318/v1/traces")
-        else:
-            exporter = OTLPSpanExporter()
-        span_processor = BatchSpanProcessor(span_exporter=exporter)
+        if exporter is None:
+            exporter = (config or TelemetryConfig.from_env()).span_exporter()
+        if sampler is None:
+            sampler = sampler_from_env()
+        span_processor = self.processor = InstrumentedBatchSpanProcessor(exporter)
+        self.interesting_processor = None
+        if isinstance(sampler, KeepInterestingSampler):
+            # Recorded-only spans are held back until we know whether their trace is worth keeping
+            span_processor = self.interesting_processor = InterestingTraceSpanProcessor(span_processor)
 
         # Create a singleton TracerProvider if not already configured
-        tracer_provider = TracerProvider(
-                sampler=TraceIdRatioBased(1.0),
-                resource=Resource.create(
-                    {"service.name": service_name, "service.instance.id": "instance-1"}
-                )
+        self.tracer_provider = TracerProvider(
+                sampler=sampler,
+                resource=resource or create_resource(service_name)
             )
+        self.tracer_provider.add_span_processor(span_processor)
 
-        trace.set_tracer_provider(tracer_provider)
-        trace.get_tracer_provider().add_span_processor(span_processor)
+        trace.set_tracer_provider(self.tracer_provider)
 
     def get_trace(self):
         return trace
 
+    def register_metrics(self, meter):
+        """
+        Report the health of the span export pipeline through the given meter.
+        """
+        self.processor.register_metrics(meter)
+        if self.interesting_processor is not None:
+            self.interesting_processor.register_metrics(meter)
+
 
 class CustomMetrics:
     """
     CustomMetrics sets up metrics collection using OpenTelemetry with a specified service name.
     """
-    def __init__(self, service_name):
+    def __init__(self, service_name, exporter=None, config=None, resource=None):
         try:
-            # Create the metrics exporter to send data to the backend.
-            if os.environ.get("SETUP") == "docker":
-                exporter = OTLPMetricExporter(endpoint="http://alloy:4318/v1/metrics")
-            else:
-                exporter = OTLPMetricExporter()
+            # Create the metrics exporter to send data to the backend, unless one was given.
+            config = config or TelemetryConfig.from_env()
+            if exporter is None:
+                exporter = config.metric_exporter()
 
             # Set up a PeriodicExportingMetricReader to export metrics at regular intervals.
-            metric_reader = PeriodicExportingMetricReader(exporter, INTERVAL_SEC)
+            metric_readers = [PeriodicExportingMetricReader(exporter, export_interval_millis=config.metric_export_interval)]
+            pull_reader = config.pull_metric_reader()
+            if pull_reader is not None:
+                metric_readers.append(pull_reader)
 
             # Create a MeterProvider with a TraceBasedExemplarFilter to enable exemplars
             # when measurements are taken in the context of a sampled span
             self.meter_provider = MeterProvider(
-                metric_readers=[metric_reader], 
-                resource=Resource.create({"service.name": service_name, "service.instance.id": "instance-1"}),
+                metric_readers=metric_readers,
+                resource=resource or create_resource(service_name),
+                # Bound the attributes of the metrics recorded per command or journey
+                views=config.metric_views(),
                 # Configure the TraceBasedExemplarFilter to add exemplars to metrics
                 exemplar_filter=TraceBasedExemplarFilter()
             )
@@ -111,17 +714,12 @@ class CustomLogFW:
     """
     CustomLogFW sets up logging using OpenTelemetry with a specified service name and instance ID.
     """
-    def __init__(self, service_name):
+    def __init__(self, service_name, resource=None):
         try:
             # Create an instance of LoggerProvider with a Resource object.
             # Resource is used to include metadata like the service name and instance ID.
             self.logger_provider = LoggerProvider(
-                resource=Resource.create(
-                    {
-                        "service.name": service_name,
-                        "service.instance.id": "instance-1"
-                    }
-                )
+                resource=resource or create_resource(service_name)
             )
             # Flag indicating that the logger provider is properly configured.
             self.logger_configured = True
@@ -130,11 +728,15 @@ class CustomLogFW:
             self.logger_provider = None
             self.logger_configured = False
             print(f"Error configuring logging: {e}")
+        self.processor = None
 
-    def setup_logging(self):
+    def setup_logging(self, exporter=None, profile=None, config=None):
         """
         Set up the logging configuration for OpenTelemetry.
 
+        :param exporter: The log exporter to use, defaults to OTLP as set up by config.
+        :param config: The TelemetryConfig to create the exporter from, read from the environment by default.
+        :param profile: The name of the batching profile, see LOG_BATCH_PROFILES.
         :return: A LoggingHandler instance configured with the logger provider.
         :raises: RuntimeError if the logger provider is not configured properly.
         """
@@ -145,18 +747,17 @@ class CustomLogFW:
         # Set the created LoggerProvider as the global logger provider.
         set_logger_provider(self.logger_provider)
 
-        # Create an instance of OTLPLogExporter to export logs.
-        if os.environ.get("SETUP") == "docker":
-            exporter = OTLPLogExporter(endpoint="http://alloy:4318/v1/logs")
-            print(exporter._endpoint, flush=True)
-        else:
-            exporter = OTLPLogExporter()
+        # Create an instance of OTLPLogExporter to export logs, unless one was given.
+        if exporter is None:
+            config = config or TelemetryConfig.from_env()
+            exporter = config.log_exporter()
+            if os.environ.get("SETUP") == "docker":
+                print(config.signal_endpoint("logs"), flush=True)
 
         # Add a BatchLogRecordProcessor to the logger provider.
         # This processor batches logs before sending them to the backend.
-        self.logger_provider.add_log_record_processor(
-            BatchLogRecordProcessor(exporter=exporter, max_queue_size=5, max_export_batch_size=1)
-        )
+        self.processor = InstrumentedBatchLogRecordProcessor(exporter, **log_batch_settings(profile))
+        self.logger_provider.add_log_record_processor(self.processor)
 
         # Create a LoggingHandler that integrates OpenTelemetry logging with the Python logging system.
         # Setting log level to NOTSET to capture all log levels.
@@ -165,4 +766,64 @@ class CustomLogFW:
         # Indicate successful logging configuration.
         print("Logging configured with OpenTelemetry.")
 
-        return handler
\ No newline at end of file
+        return handler
+
+    def register_metrics(self, meter):
+        """
+        Report the health of the log export pipeline through the given meter.
+        """
+        if self.processor is not None:
+            self.processor.register_metrics(meter)
+
+
+class TelemetryManager:
+    """
+    TelemetryManager sets up the trace, metric and log providers once per process and hands out
+    per-session telemetry carrying the session attributes. Use get_telemetry to share one per process.
+    """
+    enabled = True
+
+    def __init__(self, service_name, config=None, instance_id=None,
+                 span_exporter=None, metric_exporter=None, log_exporter=None):
+        self.service_name = service_name
+        self.instance_id = instance_id or default_instance_id()
+        self.logger = logging.getLogger(service_name)
+
+        # One exporter configuration and resource for all signals
+        self.config = config or TelemetryConfig.from_env()
+        resource = create_resource(service_name, self.instance_id)
+
+        log_fw = CustomLogFW(service_name=service_name, resource=resource)
+        self.log_handler = log_fw.setup_logging(exporter=log_exporter, config=self.config)
+        self.logger_provider = log_fw.logger_provider
+        logging.getLogger().addHandler(self.log_handler)
+        logging.getLogger().setLevel(logging.INFO)
+
+        custom_metrics = CustomMetrics(service_name=service_name, exporter=metric_exporter, config=self.config, resource=resource)
+        self.meter_provider = custom_metrics.meter_provider
+        self.meter = custom_metrics.get_meter()
+        log_fw.register_metrics(self.meter)
+
+        custom_tracer = CustomTracer(service_name=service_name, exporter=span_exporter, config=self.config, resource=resource)
+        self.tracer_provider = custom_tracer.tracer_provider
+        self.tracer = custom_tracer.get_trace().get_tracer(service_name)
+        custom_tracer.register_metrics(self.meter)
+        if self.config.spool_path:
+            self.config.spool_sender.register_metrics(self.meter)
+
+    def session(self, session_id, adventurer_name):
+        """
+        Return the telemetry for one session.
+        """
+        return SessionTelemetry.create(self.tracer, self.meter, self.logger, session_id, adventurer_name)
+
+    def _providers(self):
+        return [self.tracer_provider, self.meter_provider, self.logger_provider]
+
+    def force_flush(self):
+        for provider in self._providers():
+            provider.force_flush()
+
+    def shutdown(self):
+        for provider in self._providers():
+            provider.shutdown()
@@ -0,0 +1,136 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import socket
+import threading
+import time
+
+
+class StubOTLPReceiver:
+    """
+    StubOTLPReceiver is a minimal local stand-in for the alloy OTLP/HTTP receiver.
+
+    It accepts exports on /v1/traces, /v1/metrics and /v1/logs, throws the payloads away and
+    counts requests and bytes per signal, so load tests can size the collector without
+    running the whole observability stack. It can be stopped and started again on the same
+    port to simulate an outage.
+    """
+    SIGNALS = ("traces", "metrics", "logs")
+
+    def __init__(self, host="127.0.0.1", port=4318, delay=0.0):
+        self.host = host
+        self.port = port
+        # Artificial processing time per request, to simulate a slow collector
+        self.delay = delay
+        self.requests = dict.fromkeys(self.SIGNALS, 0)
+        self.bytes = dict.fromkeys(self.SIGNALS, 0)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._connections = set()
+
+    @property
+    def endpoint(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _record(self, signal, size):
+        with self._lock:
+            self.requests[signal] += 1
+            self.bytes[signal] += size
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with receiver._lock:
+                    receiver._connections.add(self.connection)
+
+            def finish(self):
+                with receiver._lock:
+                    receiver._connections.discard(self.connection)
+                super().finish()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                signal = self.path.rstrip("/").rsplit("/", 1)[-1]
+                if signal not in receiver.SIGNALS:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if receiver.delay:
+                    time.sleep(receiver.delay)
+                receiver._record(signal, len(body))
+                # An empty protobuf message is a valid, successful Export*ServiceResponse
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        if self._server is not None:
+            return self
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        # Pick up the real port when asked to bind to port 0
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="otlp-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        # Drop keep-alive connections too, or clients would keep exporting through them
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {signal: {"requests": self.requests[signal], "bytes": self.bytes[signal]} for signal in self.SIGNALS}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub OTLP/HTTP receiver that counts and discards exports.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to stall every request")
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between stats reports")
+    args = parser.parse_args()
+
+    with StubOTLPReceiver(args.host, args.port, args.delay) as receiver:
+        print(f"Stub OTLP receiver listening on {receiver.endpoint}", flush=True)
+        try:
+            while True:
+                time.sleep(args.interval)
+                print(receiver.stats(), flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from functools import lru_cache
+import os
+import re
+import sys
+
+
+class Colors:
+    RESET = "\033[0m"
+    RED = "\033[31m"
+    GREEN = "\033[32m"
+    YELLOW = "\033[33m"
+    BLUE = "\033[34m"
+    MAGENTA = "\033[35m"
+    CYAN = "\033[36m"
+
+
+# Universal commands offered at the end of every action menu
+UNIVERSAL_ACTIONS = ("look around",)
+
+_COLOR_CODES = re.compile(r"\033\[[0-9;]*m")
+
+
+@lru_cache(maxsize=4096)
+def strip_colors(text):
+    """
+    Return text without its color codes. Responses come from a small set of texts, so they are
+    only stripped the first time they are seen.
+    """
+    return _COLOR_CODES.sub("", text)
+
+
+class Renderer:
+    """
+    Renderer holds the texts of a world that do not depend on the adventurer: the description
+    and numbered action menu of every location, rendered once for all sessions.
+
+    The action menu lists every action of a location whatever the state of the session, so a
+    location has exactly one rendering. Texts are rendered with colors for terminals, and
+    strip_colors gives the plain text logs and other clients get.
+    """
+    def __init__(self, world):
+        self.actions = {}
+        self.menus = {}
+        self.places = {}
+        for name, location in world.locations.items():
+            actions = location.menu + UNIVERSAL_ACTIONS
+            numbered_actions = [f"{Colors.MAGENTA}{i+1}. {action}{Colors.RESET}" for i, action in enumerate(actions)]
+            menu = f"Available actions: {', '.join(numbered_actions)}"
+            self.actions[name] = actions
+            self.menus[name] = menu
+            self.places[name] = f"{Colors.GREEN}{location.description}{Colors.RESET}\n{menu}"
+
+    def message(self, location, message, effect=None):
+        """
+        Render the response to an action that does not move the adventurer, followed by the menu.
+        """
+        if effect is not None:
+            return f"{Colors.GREEN}{message}\n{effect}{Colors.RESET}\n{self.menus[location]}"
+        return f"{Colors.GREEN}{message}{Colors.RESET}\n{self.menus[location]}"
+
+
+@lru_cache(maxsize=None)
+def load_renderer(handlers):
+    """
+    Return the Renderer of the world loaded for the given handler class, built once per process.
+    """
+    from world import load_world
+
+    return Renderer(load_world(handlers))
+
+
+class OutputWriter:
+    """
+    OutputWriter collects the output of a turn and writes it to the stream in one go when flushed.
+
+    Colors are kept when the stream is a terminal, unless NO_COLOR is set, and stripped otherwise.
+    """
+    def __init__(self, stream=None, colored=None):
+        self.stream = stream or sys.stdout
+        if colored is None:
+            colored = self.stream.isatty() and not os.environ.get("NO_COLOR")
+        self.colored = colored
+        self._buffer = []
+
+    def write(self, text):
+        self._buffer.append(text if self.colored else strip_colors(text))
+        self._buffer.append("\n")
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write("".join(self._buffer))
+            self._buffer.clear()
+        self.stream.flush()
@@ -0,0 +1,43 @@
+# Scripted journeys through the world. "wait N" steps idle the bot for N seconds, which the
+# forge needs to heat up to the right temperature.
+ROUTES = {
+    "cheat": [
+        "cheat", "go to town", "quest giver", "accept quest", "go to town", "wizard", "kill him", "quit"
+    ],
+    "forge": [
+        "go to town", "blacksmith", "request sword", "heat forge", "wait 12", "check sword", "go to town",
+        "chapel", "look at sword", "go to town", "quest giver", "accept quest", "go to town", "wizard", "kill him"
+    ],
+    "holy": [
+        "cheat", "go to town", "chapel", "look at sword", "go to town", "quest giver", "accept quest",
+        "go to town", "wizard", "kill him"
+    ],
+    "evil": [
+        "cheat", "go to town", "chapel", "look at sword", "go to town", "quest giver", "accept quest",
+        "go to town", "mysterious man", "accept his offer", "go to town", "wizard", "kill him"
+    ],
+}
+
+# Randomized journeys pick numbered actions off the current menu
+RANDOM_ROUTE = "random"
+RANDOM_ROUTE_STEPS = 30
+
+
+def route_steps(route, rng, menu_size):
+    # menu_size returns the number of actions currently on the menu, for random routes
+    if route != RANDOM_ROUTE:
+        yield from ROUTES[route]
+        return
+    for _ in range(RANDOM_ROUTE_STEPS):
+        yield str(rng.randint(1, menu_size()))
+    yield "quit"
+
+
+def journey_ending(game, last_command):
+    if last_command in ("quit", "exit"):
+        return "quit"
+    if game.state.has_evil_sword:
+        return "evil sword"
+    if game.state.has_holy_sword:
+        return "holy sword"
+    return "other"
@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class Timer:
+    """
+    Handle for a callback registered with the TimerScheduler. Cancelled timers stay in the heap
+    and are skipped when their deadline comes up.
+    """
+    __slots__ = ("deadline", "callback", "cancelled")
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerScheduler:
+    """
+    TimerScheduler runs callbacks at their deadlines from a single shared thread.
+
+    Timers are kept in a heap keyed by deadline and the thread only wakes up when the earliest
+    one is due, so idle sessions cost nothing and the number of threads does not grow with the
+    number of sessions.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        # Largest delay between a deadline and its callback running since it was last read
+        self._max_lag = 0.0
+
+    def call_at(self, deadline, callback):
+        timer = Timer(deadline, callback)
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), timer))
+            # Only wake the thread up if its next deadline moved earlier
+            if self._heap[0][2] is timer:
+                self._condition.notify()
+            self._start()
+        return timer
+
+    def _start(self):
+        # Must be called with the condition held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="timer-scheduler", daemon=True)
+            self._thread.start()
+
+    def call_later(self, delay, callback):
+        return self.call_at(self.clock() + delay, callback)
+
+    def _pop_due(self):
+        # Must be called with the condition held. Returns the due timers and the delay until the next one.
+        due = []
+        now = self.clock()
+        while self._heap:
+            deadline, _, timer = self._heap[0]
+            if timer.cancelled:
+                heapq.heappop(self._heap)
+            elif deadline <= now:
+                heapq.heappop(self._heap)
+                due.append(timer)
+            else:
+                return due, deadline - now
+        return due, None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due, delay = self._pop_due()
+                if not due:
+                    self._condition.wait(delay)
+                    continue
+            self._fire(due)
+
+    def _fire(self, due):
+        for timer in due:
+            if timer.cancelled:
+                continue
+            lag = self.clock() - timer.deadline
+            if lag > self._max_lag:
+                self._max_lag = lag
+            try:
+                timer.callback()
+            except Exception:
+                logging.exception("Scheduled callback failed")
+
+    def take_max_lag(self):
+        """
+        Return the largest lag in seconds of a timer fired since the last call, and reset it.
+        """
+        lag, self._max_lag = self._max_lag, 0.0
+        return lag
+
+    def __len__(self):
+        return sum(1 for _, _, timer in self._heap if not timer.cancelled)
+
+
+class VirtualClock:
+    """
+    A clock that only moves when told to, for simulations that must not depend on real time.
+    """
+    __slots__ = ("now",)
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+class SimulatedScheduler(TimerScheduler):
+    """
+    SimulatedScheduler runs timers on a VirtualClock, without a thread. Time only passes in
+    advance, which fires the timers that come due in deadline order with the clock set to each
+    deadline, so a simulation behaves exactly as if the time had really passed.
+    """
+    def __init__(self, start=0.0):
+        super().__init__(clock=VirtualClock(start))
+
+    def _start(self):
+        pass
+
+    def advance(self, seconds):
+        self.advance_to(self.clock.now + seconds)
+
+    def advance_to(self, deadline):
+        while True:
+            with self._condition:
+                timer = self._pop_next(deadline)
+                if timer is None:
+                    self.clock.now = max(self.clock.now, deadline)
+                    return
+                self.clock.now = max(self.clock.now, timer.deadline)
+            # One at a time, as a callback may schedule timers that are due before the next one
+            self._fire([timer])
+
+    def _pop_next(self, deadline):
+        # Must be called with the condition held. Pops the earliest timer due by deadline, skipping cancelled ones.
+        while self._heap and self._heap[0][0] <= deadline:
+            _, _, timer = heapq.heappop(self._heap)
+            if not timer.cancelled:
+                return timer
+        return None
+
+
+# Shared by every session in the process
+default_scheduler = TimerScheduler()
@@ -0,0 +1,438 @@
+from base64 import b64encode
+from hashlib import sha1
+import argparse
+import asyncio
+import inspect
+import logging
+import os
+import struct
+
+from opentelemetry import trace
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+from render import strip_colors
+
+_logger = logging.getLogger(__name__)
+
+# Every message from the server ends with the prompt, so clients know when to answer
+PROMPT = "\n> "
+NAME_PROMPT = "Enter your name, brave adventurer:"
+RESTART_PROMPT = "Would you like to restart the adventure? (yes/no):"
+NEW_NAME_PROMPT = "Enter your name if you'd like to change it, or press Enter to keep the same name:"
+GOODBYE = "Thank you for playing!"
+
+# W3C trace context fields a client may send as "name: value" lines to continue its trace
+TRACE_FIELDS = ("traceparent", "tracestate")
+
+# Connections the kernel queues while the event loop is busy, so bursts of players are not refused
+LISTEN_BACKLOG = 1024
+
+# Bytes queued for a connection before sending waits for the client to read
+WRITE_BUFFER_HIGH = 64 * 1024
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+TEXT, CLOSE, PING, PONG = 0x1, 0x8, 0x9, 0xA
+
+_propagator = TraceContextTextMapPropagator()
+
+
+async def _call(result):
+    # The methods of a ShardedEngine changing sessions are coroutines, those of a GameEngine are not
+    return await result if inspect.isawaitable(result) else result
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _unmask(payload, mask):
+    # XOR the whole payload at once as one big integer instead of byte by byte
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+
+def encode_frame(opcode, payload, mask=None):
+    """
+    Encode a final WebSocket frame. Clients must mask their frames with a 4 byte mask, servers must not.
+    """
+    length = len(payload)
+    mask_bit = 0x80 if mask is not None else 0
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, mask_bit | 127, length)
+    if mask is None:
+        return header + payload
+    return header + mask + _unmask(payload, mask)
+
+
+async def read_frame(reader, max_size, masked):
+    """
+    Read one WebSocket frame and return (fin, opcode, payload).
+
+    :raises: ProtocolError for frames larger than max_size or with the wrong masking.
+    """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if bool(second & 0x80) != masked:
+        raise ProtocolError("Frames must be masked by clients only.")
+    if length > max_size:
+        raise ProtocolError("Message too long.")
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    return bool(first & 0x80), first & 0x0F, _unmask(payload, mask) if masked else payload
+
+
+class LineChannel:
+    """
+    A connection speaking the plain text line protocol: one command per line in, and responses
+    ending with the prompt out. Works with nc, telnet and scripted socket clients.
+    """
+    def __init__(self, reader, writer, colored=True):
+        self.reader = reader
+        self.writer = writer
+        self.colored = colored
+        self.headers = {}
+        self.session_id = None
+        # The trace context fields the client sent last, and the context they make up
+        self.carrier = {}
+        self.context = None
+
+    async def receive(self):
+        try:
+            line = await self.reader.readline()
+        except ValueError:
+            # The stream limit was hit before the end of the line
+            raise ProtocolError("Line too long.") from None
+        if not line:
+            raise ConnectionClosed()
+        return line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    async def send(self, text, prompt=True):
+        if not self.colored:
+            text = strip_colors(text)
+        self.writer.write((text + PROMPT if prompt else text + "\n").encode())
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+
+
+class WebSocketChannel(LineChannel):
+    """
+    A connection speaking WebSocket, with one text message per command and per response.
+    Messages are sent without colors.
+    """
+    def __init__(self, reader, writer, max_size):
+        super().__init__(reader, writer, colored=False)
+        self.max_size = max_size
+        self.upgraded = False
+
+    async def handshake(self):
+        try:
+            request = await self.reader.readuntil(b"\r\n\r\n")
+        except (asyncio.LimitOverrunError, ValueError):
+            raise ProtocolError("Handshake too long.") from None
+        except asyncio.IncompleteReadError:
+            raise ConnectionClosed() from None
+        lines = request.decode("latin-1").split("\r\n")
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                self.headers[name.strip().lower()] = value.strip()
+        key = self.headers.get("sec-websocket-key")
+        if not lines[0].startswith("GET ") or self.headers.get("upgrade", "").lower() != "websocket" or not key:
+            self.writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            raise ConnectionClosed()
+        accept = b64encode(sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        self.upgraded = True
+        await self.writer.drain()
+
+    async def receive(self):
+        fragments = []
+        while True:
+            try:
+                fin, opcode, payload = await read_frame(self.reader, self.max_size, masked=True)
+            except asyncio.IncompleteReadError:
+                raise ConnectionClosed() from None
+            if opcode == CLOSE:
+                self.writer.write(encode_frame(CLOSE, payload[:2]))
+                raise ConnectionClosed()
+            if opcode == PING:
+                self.writer.write(encode_frame(PONG, payload))
+                continue
+            if opcode == PONG:
+                continue
+            fragments.append(payload)
+            if sum(map(len, fragments)) > self.max_size:
+                raise ProtocolError("Message too long.")
+            if fin:
+                return b"".join(fragments).decode("utf-8", errors="replace").strip()
+
+    async def send(self, text, prompt=True):
+        self.writer.write(encode_frame(TEXT, (strip_colors(text) + (PROMPT if prompt else "")).encode()))
+        await self.writer.drain()
+
+    async def close(self):
+        if self.upgraded and not self.writer.is_closing():
+            self.writer.write(encode_frame(CLOSE, struct.pack("!H", 1000)))
+        self.writer.close()
+
+
+class GameServer:
+    """
+    GameServer lets remote players play over TCP, one session per connection, on a single event loop.
+
+    Clients send one command per line, or per message in WebSocket mode, and get the response
+    followed by the prompt. A connection waits for the client to read its responses before
+    reading the next command, so a slow client only holds up itself, and connections that are
+    idle for idle_timeout seconds are closed. Clients can continue their own trace by sending
+    W3C traceparent and tracestate lines, the actions that follow become spans of that trace.
+    """
+    def __init__(self, engine, host="127.0.0.1", port=4000, websocket=False, idle_timeout=300.0,
+                 max_connections=10000, max_line=4096, colored=True):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.websocket = websocket
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.max_line = max_line
+        self.colored = colored
+        self.connections = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self.handle, self.host, self.port, limit=self.max_line,
+                                                  backlog=LISTEN_BACKLOG)
+        # Port 0 picks a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def handle(self, reader, writer):
+        if self.connections >= self.max_connections:
+            writer.write(b"The world is full, please come back later.\n")
+            writer.close()
+            return
+        self.connections += 1
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        if self.websocket:
+            channel = WebSocketChannel(reader, writer, self.max_line)
+        else:
+            channel = LineChannel(reader, writer, self.colored)
+        try:
+            if self.websocket:
+                await channel.handshake()
+            await self.converse(channel)
+        except (ConnectionClosed, ConnectionError):
+            pass
+        except TimeoutError:
+            await self._farewell(channel, "You stood still for too long and your adventure has ended.")
+        except ProtocolError as e:
+            await self._farewell(channel, str(e))
+        finally:
+            self.connections -= 1
+            try:
+                if channel.session_id is not None:
+                    await _call(self.engine.close_session(channel.session_id))
+            except Exception:
+                # The connection is closed whatever happened to the session
+                _logger.exception("Failed to close session %s", channel.session_id)
+            finally:
+                await channel.close()
+
+    async def _farewell(self, channel, text):
+        try:
+            await asyncio.wait_for(channel.send(text, prompt=False), 1.0)
+        except (ConnectionError, TimeoutError):
+            pass
+
+    async def send(self, channel, text, prompt=True):
+        # A client that does not read what it is sent is treated like an idle one
+        await asyncio.wait_for(channel.send(text, prompt), self.idle_timeout)
+
+    async def receive(self, channel):
+        """
+        Return the next line from the client, taking in the trace context lines sent before it.
+        """
+        while True:
+            line = await asyncio.wait_for(channel.receive(), self.idle_timeout)
+            name, sep, value = line.partition(":")
+            if sep and name.strip().lower() in TRACE_FIELDS:
+                channel.carrier[name.strip().lower()] = value.strip()
+                channel.context = remote_context(channel.carrier)
+                continue
+            return line
+
+    async def converse(self, channel):
+        # WebSocket clients can also pass their trace context as handshake headers
+        channel.carrier = {field: channel.headers[field] for field in TRACE_FIELDS if field in channel.headers}
+        channel.context = remote_context(channel.carrier)
+
+        await self.send(channel, NAME_PROMPT)
+        name = (await self.receive(channel)).strip() or "adventurer"
+        session_id = channel.session_id = await _call(self.engine.create_session(name))
+        _logger.info("Session %s connected", session_id)
+        await self.send(channel, self.engine.welcome(session_id))
+        while True:
+            while self.engine.is_active(session_id):
+                command = await self.receive(channel)
+                response = await self.engine.submit(session_id, command, context=channel.context)
+                if not self.engine.is_active(session_id):
+                    response = f"{response}\n{RESTART_PROMPT}"
+                await self.send(channel, response)
+
+            if (await self.receive(channel)).strip().lower() != "yes":
+                await self.send(channel, GOODBYE, prompt=False)
+                return
+            await self.send(channel, NEW_NAME_PROMPT)
+            new_name = (await self.receive(channel)).strip()
+            await self.send(channel, await _call(self.engine.restart_session(session_id, new_name)))
+
+
+def remote_context(carrier):
+    """
+    Return the context of a client's trace, or None when the carrier holds no valid trace context.
+    """
+    if "traceparent" not in carrier:
+        return None
+    context = _propagator.extract(carrier)
+    if not trace.get_current_span(context).get_span_context().is_valid:
+        return None
+    return context
+
+
+class GameClient:
+    """
+    A scripted client for the server, for load tests and trying the server out.
+    """
+    def __init__(self, reader, writer, websocket=False):
+        self.reader = reader
+        self.writer = writer
+        self.websocket = websocket
+
+    @classmethod
+    async def connect(cls, host, port, websocket=False, headers=None):
+        """
+        Connect and return the client along with the server's first message.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        client = cls(reader, writer, websocket)
+        if websocket:
+            key = b64encode(os.urandom(16)).decode()
+            extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+            writer.write(
+                f"GET / HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n{extra}\r\n".encode()
+            )
+            response = await reader.readuntil(b"\r\n\r\n")
+            if not response.startswith(b"HTTP/1.1 101"):
+                raise ConnectionError(response.decode("latin-1").splitlines()[0])
+        return client, await client.read()
+
+    async def read(self):
+        """
+        Return the next message from the server without the prompt.
+        """
+        if self.websocket:
+            while True:
+                _, opcode, payload = await read_frame(self.reader, 1 << 20, masked=False)
+                if opcode == CLOSE:
+                    raise ConnectionClosed()
+                if opcode == TEXT:
+                    return payload.decode().removesuffix(PROMPT)
+        try:
+            return (await self.reader.readuntil(PROMPT.encode())).decode().removesuffix(PROMPT)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                return e.partial.decode()
+            raise ConnectionClosed() from None
+
+    def write(self, line):
+        if self.websocket:
+            self.writer.write(encode_frame(TEXT, line.encode(), mask=os.urandom(4)))
+        else:
+            self.writer.write(line.encode() + b"\n")
+
+    async def send(self, line, traceparent=None):
+        """
+        Send a command, continuing the given trace if any, and return the response.
+        """
+        if traceparent is not None:
+            self.write(f"traceparent: {traceparent}")
+        self.write(line)
+        await self.writer.drain()
+        return await self.read()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(server):
+    await server.start()
+    print(f"Adventure server listening on {server.host}:{server.port}{' (WebSocket)' if server.websocket else ''}")
+    await server.serve_forever()
+
+
+def main():
+    from engine import GameEngine
+    from main import SERVICE_NAME, AdventureGame
+    from store import SessionStore
+    from telemetry import get_telemetry
+
+    parser = argparse.ArgumentParser(description="Serve the text adventure to remote players.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on, 0.0.0.0 for every interface")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--websocket", action="store_true", help="Speak WebSocket instead of plain text lines")
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="Seconds before an idle connection is closed")
+    parser.add_argument("--max-connections", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Play the sessions on this many worker processes, to use more than one core")
+    parser.add_argument("--plain", action="store_true", help="Send responses without colors")
+    parser.add_argument("--no-telemetry", action="store_true", help="Serve without recording or exporting telemetry")
+    args = parser.parse_args()
+
+    if args.no_telemetry:
+        get_telemetry(SERVICE_NAME, enabled=False)
+    if args.workers:
+        from shard import ShardedEngine
+
+        engine = ShardedEngine(AdventureGame, args.workers)
+    else:
+        engine = GameEngine(AdventureGame, store=SessionStore.from_env())
+    server = GameServer(engine, args.host, args.port, websocket=args.websocket, idle_timeout=args.idle_timeout,
+                        max_connections=args.max_connections, colored=not args.plain)
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+from bisect import bisect
+from hashlib import blake2b
+import argparse
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import select
+import socket
+import struct
+import time
+import uuid
+
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+# Points per worker on the hash ring, more points spread the sessions more evenly
+RING_REPLICAS = 64
+
+# Requests sent to a worker and not answered yet before the next ones wait
+MAX_IN_FLIGHT = 128
+
+# Bytes the supervisor buffers for a worker that does not keep up before new requests wait
+WRITE_BUFFER_HIGH = 1024 * 1024
+
+# Messages between the supervisor and a worker are pickled and prefixed with their length
+FRAME = struct.Struct("!Q")
+
+# Seconds between the session gauge snapshots a worker sends to the supervisor
+SNAPSHOT_INTERVAL = 1.0
+
+# A worker exiting on its own is replaced by a new one, unless it keeps exiting: after this
+# many replacements in a row, each exiting within RESTART_WINDOW seconds, it is taken off the ring
+MAX_RESTARTS = 3
+RESTART_WINDOW = 60.0
+
+# Seconds a worker that stopped answering gets to save its sessions and exit before it is killed
+WORKER_EXIT_TIMEOUT = 30.0
+
+_logger = logging.getLogger(__name__)
+
+_propagator = TraceContextTextMapPropagator()
+
+
+def _hash(key):
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of keys onto nodes. Every node owns many points on a ring and a key
+    belongs to the node owning the first point after the hash of the key, so adding a node
+    only moves the keys landing on its points, about 1/n of them.
+    """
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in self.points]
+
+    def node_for(self, key):
+        return self.points[bisect(self._hashes, _hash(key)) % len(self.points)][1]
+
+
+def _run(coroutine):
+    # Engine coroutines never suspend, so they complete on their first step without an event loop
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    coroutine.close()
+    raise RuntimeError("Engine coroutine suspended in a shard worker.")
+
+
+def _frame(message):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    return FRAME.pack(len(data)) + data
+
+
+def _failure(error):
+    # The supervisor raises the exception of a failed request again, so it must survive the trip
+    try:
+        pickle.loads(pickle.dumps(error, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return RuntimeError(repr(error))
+    return error
+
+
+def _reply_frame(replies):
+    try:
+        return _frame(replies)
+    except Exception:
+        # A value that cannot be pickled only fails its own request, not the worker and all its sessions
+        return _frame([_picklable(reply) for reply in replies])
+
+
+def _picklable(reply):
+    request_id, ok, value = reply
+    try:
+        pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return request_id, False, RuntimeError(repr(e))
+    return reply
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+def _recv_message(sock):
+    return pickle.loads(_recv_exactly(sock, FRAME.unpack(_recv_exactly(sock, FRAME.size))[0]))
+
+
+def _context(carrier):
+    if not carrier:
+        return None
+    from server import remote_context
+
+    return remote_context(carrier)
+
+
+# What a worker does for each request, all get the engine and the session id first
+def _create(engine, session_id, adventurer_name):
+    engine.create_session(adventurer_name, session_id)
+    return engine.welcome(session_id), engine.is_active(session_id)
+
+
+def _submit(engine, session_id, command, carrier):
+    return _run(engine.submit(session_id, command, _context(carrier))), engine.is_active(session_id)
+
+
+def _submit_batch(engine, session_id, commands, stop_on_failure, carrier):
+    responses = _run(engine.submit_batch(session_id, commands, stop_on_failure, _context(carrier)))
+    return responses, engine.is_active(session_id)
+
+
+def _restart(engine, session_id, adventurer_name):
+    return engine.restart_session(session_id, adventurer_name), engine.is_active(session_id)
+
+
+def _close(engine, session_id):
+    engine.close_session(session_id)
+
+
+OPERATIONS = {
+    "create": _create,
+    "submit": _submit,
+    "submit_batch": _submit_batch,
+    "restart": _restart,
+    "close": _close,
+}
+
+
+def _worker_main(sock, game_factory):
+    from engine import GameEngine
+    from gauges import session_gauges
+    from main import SERVICE_NAME
+    from store import SessionStore
+    from telemetry import get_telemetry
+
+    telemetry = get_telemetry(SERVICE_NAME)
+    # The supervisor reports the sessions of every worker together, from the snapshots sent to it
+    gauges = session_gauges(telemetry.meter, observe_sessions=False)
+    engine = GameEngine(game_factory, store=SessionStore.from_env())
+    next_snapshot = 0.0
+    try:
+        while True:
+            replies = []
+            # Wake up at least once per snapshot interval, the forges keep heating while nobody plays
+            if select.select([sock], [], [], SNAPSHOT_INTERVAL)[0]:
+                requests = _recv_message(sock)
+                if requests is None:
+                    break
+                for request_id, operation, args in requests:
+                    try:
+                        replies.append((request_id, True, OPERATIONS[operation](engine, *args)))
+                    except Exception as e:
+                        replies.append((request_id, False, _failure(e)))
+            now = time.monotonic()
+            if now >= next_snapshot:
+                replies.append((None, True, gauges.snapshot()))
+                next_snapshot = now + SNAPSHOT_INTERVAL
+            if replies:
+                # Blocking is fine here, the supervisor reads replies whatever it is writing
+                sock.sendall(_reply_frame(replies))
+    except (EOFError, ConnectionError, KeyboardInterrupt):
+        pass
+    finally:
+        sock.close()
+        if engine.store is not None:
+            engine.suspend_all()
+        telemetry.shutdown()
+
+
+class Shard:
+    __slots__ = (
+        "index", "sock", "process", "started", "restarts", "pending", "outbox", "slots", "writer", "reader",
+        "attached", "stopped",
+    )
+
+    def __init__(self, index, sock, process, restarts=0):
+        self.index = index
+        self.sock = sock
+        self.process = process
+        self.started = time.monotonic()
+        # Workers that exited in a row at this index before this one
+        self.restarts = restarts
+        # Futures of the requests sent and not answered yet, by request id
+        self.pending = {}
+        # Requests waiting to be sent with the next flush
+        self.outbox = []
+        self.slots = None
+        # The stream writer the supervisor sends requests with, the task reading the replies and
+        # the task setting them up
+        self.writer = None
+        self.reader = None
+        self.attached = None
+        self.stopped = False
+
+
+class ShardedEngine:
+    """
+    ShardedEngine spreads sessions over worker processes, each running its own GameEngine, so
+    a server can use every core instead of one.
+
+    Sessions are assigned to workers by consistent hashing of their id. Requests made during
+    one pass of the event loop are sent to a worker as a single message and its replies come
+    back the same way. The supervisor never blocks on a worker: requests are written without
+    blocking the loop and new ones wait while a worker has too much unread data. The engine keeps the welcome text and activity of every session, so
+    welcome and is_active answer without asking the worker; the other methods are coroutines.
+
+    Workers export their own spans, logs and command latencies. The session gauges are reported
+    by the supervisor for all workers together, from snapshots the workers send every second.
+
+    A worker that exits on its own fails the requests it has not answered and is replaced by a
+    new one, which resumes the sessions it saved to the store. Without a store its sessions are
+    lost. A worker that keeps exiting is taken off the hash ring and its sessions move to the others.
+    """
+    def __init__(self, game_factory, workers=None):
+        from gauges import session_gauges
+        from main import SERVICE_NAME
+        from telemetry import get_telemetry
+
+        workers = workers or os.cpu_count()
+        self.game_factory = game_factory
+        # Workers are spawned rather than forked, the telemetry and scheduler threads of this process must not be copied
+        self._context = multiprocessing.get_context("spawn")
+        self.shards = [self._spawn(index) for index in range(workers)]
+        # Indexes of the workers on the hash ring
+        self._live = set(range(workers))
+        self.ring = HashRing(range(workers))
+        self.gauges = session_gauges(get_telemetry(SERVICE_NAME).meter)
+        self.intros = {}
+        self.active = {}
+        self._ids = itertools.count()
+        self._loop = None
+        self._closing = False
+
+    def _spawn(self, index, restarts=0):
+        sock, child_sock = socket.socketpair()
+        process = self._context.Process(target=_worker_main, args=(child_sock, self.game_factory),
+                                        name=f"adventure-shard-{index}", daemon=True)
+        process.start()
+        child_sock.close()
+        return Shard(index, sock, process, restarts)
+
+    async def _attach(self, shard):
+        shard.slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        reader, shard.writer = await asyncio.open_connection(sock=shard.sock)
+        shard.writer.transport.set_write_buffer_limits(WRITE_BUFFER_HIGH)
+        shard.reader = self._loop.create_task(self._receive(shard, reader))
+
+    async def _request(self, session_id, operation, *args):
+        if self._loop is None:
+            # Workers are talked to from the event loop the engine is first used from
+            self._loop = asyncio.get_running_loop()
+            for shard in self.shards:
+                shard.attached = self._loop.create_task(self._attach(shard))
+        if self.ring is None:
+            raise ConnectionError("No shard is running.")
+        shard = self.shards[self.ring.node_for(session_id)]
+        if not shard.attached.done():
+            await shard.attached
+        if shard.stopped:
+            raise ConnectionError(f"Shard {shard.index} has stopped.")
+        async with shard.slots:
+            # Wait while the worker has not read what it was sent already
+            await shard.writer.drain()
+            if shard.stopped:
+                raise ConnectionError(f"Shard {shard.index} has stopped.")
+            request_id = next(self._ids)
+            future = shard.pending[request_id] = self._loop.create_future()
+            shard.outbox.append((request_id, operation, (session_id, *args)))
+            if len(shard.outbox) == 1:
+                self._loop.call_soon(self._flush, shard)
+            return await future
+
+    def _flush(self, shard):
+        requests, shard.outbox = shard.outbox, []
+        if shard.writer.is_closing():
+            self._stopped(shard)
+        else:
+            shard.writer.write(_frame(requests))
+
+    async def _receive(self, shard, reader):
+        try:
+            while True:
+                size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+                for request_id, ok, value in pickle.loads(await reader.readexactly(size)):
+                    if request_id is None:
+                        self.gauges.update_remote(shard.index, value)
+                        continue
+                    future = shard.pending.pop(request_id, None)
+                    if future is None or future.done():
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self._stopped(shard)
+            if not self._closing:
+                await self._replace(shard)
+
+    async def _replace(self, shard):
+        # Let a worker that is exiting save its sessions before another one resumes them
+        await self._loop.run_in_executor(None, shard.process.join, WORKER_EXIT_TIMEOUT)
+        if shard.process.is_alive():
+            shard.process.kill()
+            await self._loop.run_in_executor(None, shard.process.join)
+        if self._closing:
+            return
+        restarts = shard.restarts + 1 if time.monotonic() - shard.started < RESTART_WINDOW else 0
+        if restarts > MAX_RESTARTS:
+            _logger.error("Shard %d exited with code %s again, taking it off the ring.", shard.index, shard.process.exitcode)
+            self._live.discard(shard.index)
+            self.ring = HashRing(sorted(self._live)) if self._live else None
+            return
+        _logger.warning("Shard %d exited with code %s, starting a new worker.", shard.index, shard.process.exitcode)
+        replacement = self.shards[shard.index] = self._spawn(shard.index, restarts)
+        replacement.attached = self._loop.create_task(self._attach(replacement))
+
+    def _stopped(self, shard):
+        if not shard.stopped:
+            shard.stopped = True
+            if shard.writer is not None:
+                shard.writer.close()
+            else:
+                shard.sock.close()
+        self.gauges.discard_remote(shard.index)
+        pending, shard.pending = shard.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Shard {shard.index} has stopped."))
+
+    def shard_of(self, session_id):
+        return self.ring.node_for(session_id)
+
+    async def create_session(self, adventurer_name, session_id=None):
+        """
+        Start a new adventure on the worker owning the session id and return the session id.
+        """
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+        self.intros[session_id], self.active[session_id] = await self._request(session_id, "create", adventurer_name)
+        return session_id
+
+    def welcome(self, session_id):
+        return self.intros[session_id]
+
+    def is_active(self, session_id):
+        return self.active[session_id]
+
+    async def submit(self, session_id, command, context=None):
+        response, self.active[session_id] = await self._request(session_id, "submit", command, carrier(context))
+        return response
+
+    async def submit_batch(self, session_id, commands, stop_on_failure=False, context=None):
+        responses, self.active[session_id] = await self._request(
+            session_id, "submit_batch", list(commands), stop_on_failure, carrier(context)
+        )
+        return responses
+
+    async def restart_session(self, session_id, adventurer_name=None):
+        self.intros[session_id], self.active[session_id] = await self._request(session_id, "restart", adventurer_name)
+        return self.intros[session_id]
+
+    async def close_session(self, session_id):
+        self.intros.pop(session_id, None)
+        self.active.pop(session_id, None)
+        await self._request(session_id, "close")
+
+    async def close(self):
+        """
+        Stop the workers once they have answered every request, saving their sessions to the store if they have one.
+        """
+        self._closing = True
+        for shard in self.shards:
+            if shard.attached is not None:
+                await shard.attached
+        for shard in self.shards:
+            if shard.stopped:
+                continue
+            if shard.writer is not None:
+                if shard.outbox:
+                    self._flush(shard)
+                shard.writer.write(_frame(None))
+            else:
+                shard.sock.sendall(_frame(None))
+        loop = asyncio.get_running_loop()
+        for shard in self.shards:
+            await loop.run_in_executor(None, shard.process.join)
+            if shard.reader is not None:
+                await shard.reader
+            self._stopped(shard)
+
+    def __len__(self):
+        return len(self.active)
+
+
+def carrier(context):
+    # Trace contexts cross to the workers in their W3C text form
+    if context is None:
+        return None
+    fields = {}
+    _propagator.inject(fields, context=context)
+    return fields
+
+
+async def measure(workers, sessions, duration):
+    """
+    Play sessions endless journeys on a ShardedEngine with workers processes for duration seconds and return the commands per second.
+    """
+    from bench import COMMANDS
+    from main import AdventureGame
+
+    engine = ShardedEngine(AdventureGame, workers)
+    session_ids = await asyncio.gather(*(engine.create_session(f"shard-bench-{i}") for i in range(sessions)))
+    commands = 0
+
+    async def play(session_id):
+        nonlocal commands
+        for command in itertools.cycle(COMMANDS):
+            if time.perf_counter() >= deadline:
+                return
+            await engine.submit(session_id, command)
+            commands += 1
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(play(session_id) for session_id in session_ids))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(engine.close_session(session_id) for session_id in session_ids))
+    await engine.close()
+    return commands / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how command throughput scales with shard workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to measure")
+    parser.add_argument("--sessions", type=int, default=200, help="Concurrent sessions")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to play per worker count")
+    parser.add_argument("--no-telemetry", action="store_true", help="Measure without recording or exporting telemetry")
+    args = parser.parse_args()
+
+    if args.no_telemetry:
+        # Set for the workers too, they inherit the environment
+        os.environ["OTEL_SDK_DISABLED"] = "true"
+    print(f"{os.cpu_count()} CPUs")
+    baseline = None
+    for workers in args.workers:
+        rate = asyncio.run(measure(workers, args.sessions, args.duration))
+        baseline = baseline or rate
+        print(f"{workers:>3} workers {rate:>12.0f} commands/s {rate / baseline:>6.2f}x", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+from collections import namedtuple
+import argparse
+import base64
+import json
+import sys
+import time
+
+from routes import ROUTES, journey_ending
+from scheduler import SimulatedScheduler
+
+SimulationResult = namedtuple("SimulationResult", ["responses", "state", "ending", "virtual_seconds"])
+
+# The endings the scripted load test routes must reach
+EXPECTED_ENDINGS = {
+    "cheat": "quit",
+    "forge": "holy sword",
+    "holy": "holy sword",
+    "evil": "evil sword",
+}
+
+
+class CommandLog:
+    """
+    CommandLog is the event log of one session: every command and restart with the time it
+    happened at, in seconds since the session started on its scheduler clock. Replaying it on a
+    simulated scheduler reproduces the session exactly, forge heat included.
+
+    A log recorded from a resumed session also holds the state it started from, packed with
+    GameState.to_bytes relative to the start of the log.
+    """
+    TURN = "turn"
+    RESTART = "restart"
+
+    def __init__(self, adventurer_name, started_at=0.0, entries=None, state=None):
+        self.adventurer_name = adventurer_name
+        self.started_at = started_at
+        self.entries = entries if entries is not None else []
+        self.state = state
+
+    def record(self, now, command):
+        self.entries.append((now - self.started_at, self.TURN, command))
+
+    def record_restart(self, now, adventurer_name=None):
+        self.entries.append((now - self.started_at, self.RESTART, adventurer_name or ""))
+
+    @classmethod
+    def from_route(cls, steps, adventurer_name="simulation", think_time=0.0):
+        """
+        Build a log from scripted steps, where "wait N" steps let N seconds pass.
+        """
+        log = cls(adventurer_name)
+        now = 0.0
+        for step in steps:
+            if step.startswith("wait "):
+                now += float(step.split()[1])
+                continue
+            log.entries.append((now, cls.TURN, step))
+            now += think_time
+        return log
+
+    def dump(self, f):
+        # One JSON object per line, the first one describes the session
+        header = {"adventurer": self.adventurer_name}
+        if self.state is not None:
+            header["state"] = base64.b64encode(self.state).decode()
+        f.write(json.dumps(header) + "\n")
+        for at, kind, value in self.entries:
+            f.write(json.dumps({"at": round(at, 6), kind: value}) + "\n")
+
+    @classmethod
+    def load(cls, f):
+        """
+        :raises: ValueError for lines that are not log entries.
+        """
+        header = json.loads(f.readline())
+        log = cls(header["adventurer"], state=base64.b64decode(header["state"]) if "state" in header else None)
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            kind = cls.TURN if cls.TURN in entry else cls.RESTART if cls.RESTART in entry else None
+            if kind is None:
+                raise ValueError(f"Not a command log entry: {line.strip()}")
+            log.entries.append((entry["at"], kind, entry[kind]))
+        return log
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_telemetry = None
+
+
+def simulation_telemetry():
+    # Shared by all simulated sessions, so they register their gauges once
+    global _telemetry
+    if _telemetry is None:
+        from telemetry import NoOpTelemetry
+        _telemetry = NoOpTelemetry("adventure-simulation")
+    return _telemetry
+
+
+def replay(log, telemetry=None, session_id="simulation"):
+    """
+    Play a command log on a new game in virtual time and return a SimulationResult.
+    Pass telemetry to record spans, logs and metrics of the replay.
+    """
+    from main import AdventureGame
+    from state import GameState
+
+    scheduler = SimulatedScheduler()
+    game = AdventureGame(log.adventurer_name, scheduler=scheduler, telemetry=telemetry or simulation_telemetry(),
+                         session_id=session_id)
+    if log.state is not None:
+        game.restore(GameState.from_bytes(log.state, scheduler.clock()).snapshot())
+    responses = [game.start_journey()]
+    last_command = None
+    for at, kind, value in log.entries:
+        scheduler.advance_to(at)
+        if kind == CommandLog.RESTART:
+            game.restart_adventure(value or None)
+            responses.append(game.start_journey())
+        elif game.state.game_active:
+            last_command = value
+            responses.append(game.take_turn(value))
+    state = game.state.copy()
+    ending = journey_ending(game, last_command) if not state.game_active else None
+    game.close()
+    return SimulationResult(responses, state, ending, scheduler.clock())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted routes or recorded command logs in virtual time.")
+    parser.add_argument("routes", nargs="*", default=list(ROUTES), help=f"Routes to simulate: {', '.join(ROUTES)}")
+    parser.add_argument("--replay", metavar="PATH", nargs="+", default=[], help="Command logs to replay instead of routes")
+    parser.add_argument("--record", metavar="PATH", default=None, help="Write the log of the single route simulated to PATH")
+    parser.add_argument("--transcript", action="store_true", help="Print the responses of every simulation")
+    args = parser.parse_args()
+
+    logs = {}
+    if args.replay:
+        for path in args.replay:
+            with open(path) as f:
+                logs[path] = CommandLog.load(f)
+    else:
+        unknown = [route for route in args.routes if route not in ROUTES]
+        if unknown:
+            parser.error(f"Unknown routes: {', '.join(unknown)}")
+        logs = {route: CommandLog.from_route(ROUTES[route], route) for route in args.routes}
+    if args.record:
+        if len(logs) != 1:
+            parser.error("--record needs exactly one route.")
+        with open(args.record, "w") as f:
+            next(iter(logs.values())).dump(f)
+
+    failed = False
+    for name, log in logs.items():
+        start = time.perf_counter()
+        result = replay(log)
+        elapsed = time.perf_counter() - start
+        # Every replay must come out the same, and scripted routes must reach their ending
+        deterministic = replay(log) == result
+        expected = EXPECTED_ENDINGS.get(name)
+        ok = deterministic and (expected is None or result.ending == expected)
+        failed = failed or not ok
+        print(f"{name:<10} {'ok' if ok else 'FAILED':<7} ending={result.ending} turns={len(log)} "
+              f"virtual={result.virtual_seconds:.1f}s real={elapsed * 1000:.2f}ms"
+              f"{'' if deterministic else ' (not deterministic)'}")
+        if args.transcript:
+            print("\n".join(result.responses))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
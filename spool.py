@@ -0,0 +1,338 @@
+from io import BytesIO
+import gzip
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from opentelemetry import metrics
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk._logs.export import LogExporter, LogExportResult
+from opentelemetry.sdk.metrics.export import MetricExporter, MetricExportResult
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+import requests
+
+# Internal logger that does not propagate, so export problems never loop back into the log
+# exporter. Without a handler added by the application, its warnings go to stderr.
+_logger = logging.getLogger(__name__)
+_logger.propagate = False
+
+SIGNALS = ("traces", "metrics", "logs")
+
+
+class RingSpool:
+    """
+    RingSpool is a size-bounded FIFO of binary records kept in a memory-mapped file.
+
+    Records are written back to back into a circular data region after a small header holding
+    the read and write offsets, so the spool survives a restart of the process. When a new
+    record does not fit, the oldest records are dropped to make room.
+
+    The header only ever points at records that are completely on disk: a record is written and
+    synced before the header takes it in, and the header gives up the oldest records before they
+    are overwritten. A file whose header does not describe a valid chain of records is treated
+    as empty.
+    """
+    HEADER = struct.Struct("<8sIQQQQ")  # magic, version, head, tail, used bytes, record count
+    HEADER_SIZE = 64
+    RECORD = struct.Struct("<IB")  # payload length, signal
+    MAGIC = b"ADVSPOOL"
+    VERSION = 1
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.dropped = 0
+        # Records removed from the head so far, which tells pop whether the head is still the record peeked
+        self._removed = 0
+        self._lock = threading.Lock()
+
+        size = self.HEADER_SIZE + capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            existing = os.fstat(fd).st_size
+            if existing != size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, version, head, tail, used, count = self.HEADER.unpack_from(self._map, 0)
+        if existing == size and magic == self.MAGIC and version == self.VERSION and self._valid(head, tail, used, count):
+            self._head, self._tail, self._used, self._count = head, tail, used, count
+        else:
+            # A new file, one written with another size or format, or a corrupt one: start empty
+            self._head = self._tail = self._used = self._count = 0
+            self._write_header()
+
+    def _valid(self, head, tail, used, count):
+        # Walk the records from head, they must add up to exactly used bytes ending at tail
+        if head >= self.capacity or tail >= self.capacity or used > self.capacity or count > used // self.RECORD.size:
+            return False
+        offset, remaining = head, used
+        for _ in range(count):
+            if remaining < self.RECORD.size:
+                return False
+            length, signal = self.RECORD.unpack(self._read(offset, self.RECORD.size))
+            size = self.RECORD.size + length
+            if size > remaining or signal >= len(SIGNALS):
+                return False
+            offset = (offset + size) % self.capacity
+            remaining -= size
+        return remaining == 0 and offset == tail
+
+    def _write_header(self):
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.VERSION, self._head, self._tail, self._used, self._count)
+        self._map.flush(0, min(mmap.PAGESIZE, len(self._map)))
+
+    def _sync(self, offset, size):
+        # Flush the pages holding size bytes of the data region from offset, which may wrap around
+        first = min(size, self.capacity - offset)
+        self._sync_range(self.HEADER_SIZE + offset, first)
+        if first < size:
+            self._sync_range(self.HEADER_SIZE, size - first)
+
+    def _sync_range(self, start, size):
+        page_start = start - start % mmap.PAGESIZE
+        self._map.flush(page_start, min(start + size, len(self._map)) - page_start)
+
+    def _write(self, offset, data):
+        # Write data into the circular region starting at offset, wrapping around its end
+        first = min(len(data), self.capacity - offset)
+        start = self.HEADER_SIZE + offset
+        self._map[start:start + first] = data[:first]
+        if first < len(data):
+            self._map[self.HEADER_SIZE:self.HEADER_SIZE + len(data) - first] = data[first:]
+        return (offset + len(data)) % self.capacity
+
+    def _read(self, offset, size):
+        first = min(size, self.capacity - offset)
+        start = self.HEADER_SIZE + offset
+        data = self._map[start:start + first]
+        if first < size:
+            data += self._map[self.HEADER_SIZE:self.HEADER_SIZE + size - first]
+        return data
+
+    def _peek_header(self):
+        length, signal = self.RECORD.unpack(self._read(self._head, self.RECORD.size))
+        return length, signal
+
+    def _drop_oldest(self):
+        length, _ = self._peek_header()
+        size = self.RECORD.size + length
+        self._head = (self._head + size) % self.capacity
+        self._used -= size
+        self._count -= 1
+        self._removed += 1
+
+    def append(self, signal, payload):
+        """
+        Add a record to the end of the spool, dropping the oldest records if needed.
+        Returns False if the record is too large to ever fit.
+        """
+        size = self.RECORD.size + len(payload)
+        if size > self.capacity:
+            self.dropped += 1
+            return False
+        with self._lock:
+            if self.capacity - self._used < size:
+                while self.capacity - self._used < size:
+                    self._drop_oldest()
+                    self.dropped += 1
+                # Let go of the dropped records before their bytes are overwritten
+                self._write_header()
+            offset = self._write(self._tail, self.RECORD.pack(len(payload), signal))
+            tail = self._write(offset, payload)
+            self._sync(self._tail, size)
+            # The header takes the record in last, so a crash mid-write loses at most the new record
+            self._tail = tail
+            self._used += size
+            self._count += 1
+            self._write_header()
+        return True
+
+    def peek(self):
+        """
+        Return the oldest record as (position, signal, payload) without removing it, or None when empty.
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            length, signal = self._peek_header()
+            return self._removed, signal, self._read((self._head + self.RECORD.size) % self.capacity, length)
+
+    def pop(self, position):
+        """
+        Remove the record peeked at position, unless append already dropped it to make room.
+        """
+        with self._lock:
+            if self._count and self._removed == position:
+                self._drop_oldest()
+                self._write_header()
+
+    @property
+    def used(self):
+        return self._used
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+
+
+class SpoolingSender:
+    """
+    SpoolingSender posts encoded OTLP requests to the collector, and spools them to a RingSpool
+    when it cannot. A background thread replays the spool in order once the collector answers again.
+    New requests go to the back of the spool while it is not empty, so nothing overtakes older data.
+    """
+    def __init__(self, config, spool, retry_interval=1.0, max_retry_interval=30.0):
+        self.config = config
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._users = 0
+        # An HTTP session per thread posting, the exporter threads and the replay thread
+        self._sessions = threading.local()
+        self._thread = threading.Thread(target=self._replay, name="otlp-spool", daemon=True)
+        self._thread.start()
+
+    def acquire(self):
+        self._users += 1
+        return self
+
+    def _post(self, signal, payload):
+        """
+        Send one request. Returns True when it was accepted, False when it should be retried later.
+        Requests the collector rejects outright are dropped, as retrying them cannot help.
+        """
+        headers = {"Content-Type": "application/x-protobuf", **self.config.headers}
+        data = payload
+        if self.config.compression == "gzip":
+            buffer = BytesIO()
+            with gzip.GzipFile(fileobj=buffer, mode="w") as stream:
+                stream.write(payload)
+            data = buffer.getvalue()
+            headers["Content-Encoding"] = "gzip"
+        try:
+            response = self._session().post(
+                self.config.signal_endpoint(SIGNALS[signal]), data=data, headers=headers, timeout=self.config.timeout
+            )
+        except requests.RequestException:
+            return False
+        if response.ok:
+            return True
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            return False
+        _logger.warning("Collector rejected %s export with status %s, dropping it.", SIGNALS[signal], response.status_code)
+        return True
+
+    def _session(self):
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = self._sessions.session = self.config.new_session()
+        return session
+
+    def send(self, signal, payload):
+        if len(self.spool) or not self._post(signal, payload):
+            self.spool.append(signal, payload)
+            self._wakeup.set()
+
+    def _replay(self):
+        interval = self.retry_interval
+        while not self._stopped:
+            record = self.spool.peek()
+            if record is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            position, signal, payload = record
+            if self._post(signal, payload):
+                self.spool.pop(position)
+                interval = self.retry_interval
+            else:
+                # The collector is still away, back off before trying the oldest record again
+                self._wakeup.clear()
+                self._wakeup.wait(interval)
+                interval = min(interval * 2, self.max_retry_interval)
+
+    def register_metrics(self, meter):
+        """
+        Report how much undelivered telemetry waits in the spool through the given meter.
+        """
+        meter.create_observable_gauge(
+            name="spool_records",
+            description="Export requests waiting in the spool",
+            callbacks=[lambda options: [metrics.Observation(len(self.spool))]]
+        )
+        meter.create_observable_gauge(
+            name="spool_bytes",
+            unit="By",
+            description="Bytes used in the spool",
+            callbacks=[lambda options: [metrics.Observation(self.spool.used)]]
+        )
+        meter.create_observable_counter(
+            name="spool_records_dropped",
+            description="Export requests dropped because the spool was full",
+            callbacks=[lambda options: [metrics.Observation(self.spool.dropped)]]
+        )
+
+    def release(self):
+        """
+        Called when an exporter using the sender shuts down; the last one stops the replay thread.
+        """
+        self._users -= 1
+        if self._users > 0 or self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join()
+        self.spool.close()
+
+
+class SpoolingSpanExporter(SpanExporter):
+    def __init__(self, sender):
+        self.sender = sender.acquire()
+
+    def export(self, spans):
+        self.sender.send(0, encode_spans(spans).SerializePartialToString())
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        self.sender.release()
+
+
+class SpoolingMetricExporter(MetricExporter):
+    def __init__(self, sender, **kwargs):
+        super().__init__(**kwargs)
+        self.sender = sender.acquire()
+
+    def export(self, metrics_data, timeout_millis=10_000, **kwargs):
+        self.sender.send(1, encode_metrics(metrics_data).SerializePartialToString())
+        return MetricExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis=10_000):
+        return True
+
+    def shutdown(self, timeout_millis=30_000, **kwargs):
+        self.sender.release()
+
+
+class SpoolingLogExporter(LogExporter):
+    def __init__(self, sender):
+        self.sender = sender.acquire()
+
+    def export(self, batch):
+        self.sender.send(2, encode_logs(batch).SerializePartialToString())
+        return LogExportResult.SUCCESS
+
+    def shutdown(self):
+        self.sender.release()
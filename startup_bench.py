@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from bench import compare
+from otlp_stub import StubOTLPReceiver
+
+# Each scenario is run in a fresh interpreter, from nothing imported to a session ready for its first command
+SCENARIOS = {
+    "import": "import main",
+    "session.noop": (
+        "import main\n"
+        "from telemetry import get_telemetry\n"
+        "get_telemetry(main.SERVICE_NAME, enabled=False)\n"
+        "main.AdventureGame('bench').start_journey()\n"
+    ),
+    "session.sdk": (
+        "import main\n"
+        "from telemetry import get_telemetry\n"
+        "get_telemetry(main.SERVICE_NAME, enabled=True)\n"
+        "main.AdventureGame('bench').start_journey()\n"
+    ),
+}
+
+
+def parse_importtime(output):
+    """
+    Return the total import time in microseconds and the top level imports with their cumulative time.
+    """
+    total = 0
+    top_level = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        total += int(self_us)
+        # Nested imports are indented past the single space after the bar
+        if not name.startswith("  "):
+            top_level.append((name.strip(), int(cumulative_us)))
+    return total, top_level
+
+
+def run_scenario(code, env):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+    total, top_level = parse_importtime(result.stderr)
+    return wall, total, top_level
+
+
+def run_benchmarks(names, runs, top):
+    # The SDK scenario exports to a local stub on exit instead of waiting on a missing collector
+    with StubOTLPReceiver(port=0) as receiver:
+        env = {**os.environ, "OTEL_EXPORTER_OTLP_ENDPOINT": receiver.endpoint, "PYTHONDONTWRITEBYTECODE": "1"}
+        env.pop("SETUP", None)
+        env.pop("OTEL_SDK_DISABLED", None)
+        results = {}
+        for name in names:
+            walls, imports = [], []
+            for _ in range(runs):
+                wall, total, top_level = run_scenario(SCENARIOS[name], env)
+                walls.append(wall)
+                imports.append(total)
+            results[name] = {
+                "wall_ms": round(statistics.median(walls) * 1000, 1),
+                "import_ms": round(statistics.median(imports) / 1000, 1),
+                "runs": runs,
+                "top_imports": [
+                    {"module": module, "ms": round(us / 1000, 1)}
+                    for module, us in sorted(top_level, key=lambda item: item[1], reverse=True)[:top]
+                ],
+            }
+            print(f"{name:<14} {results[name]['wall_ms']:>10.1f} ms wall {results[name]['import_ms']:>10.1f} ms importing", flush=True)
+            for entry in results[name]["top_imports"]:
+                print(f"    {entry['module']:<40} {entry['ms']:>8.1f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the game with and without telemetry.")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=f"Scenarios to run: {', '.join(SCENARIOS)}")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per scenario, the median is kept")
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest top level imports to list")
+    parser.add_argument("--output", default="startup_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", metavar="PATH", default=None, help="Previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.scenarios, args.runs, args.top)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold, key="wall_ms", unit="ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
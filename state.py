@@ -0,0 +1,137 @@
+import math
+import struct
+
+
+class _Flag:
+    """
+    Descriptor exposing a single bit of GameState.flags as a boolean attribute. Setting one
+    rewrites the whole int, so a state must only be changed from one thread at a time.
+    """
+    __slots__ = ("mask",)
+
+    def __init__(self, bit):
+        self.mask = 1 << bit
+
+    def __get__(self, state, owner=None):
+        if state is None:
+            return self
+        return (state.flags & self.mask) != 0
+
+    def __set__(self, state, value):
+        if value:
+            state.flags |= self.mask
+        else:
+            state.flags &= ~self.mask
+
+
+class GameState:
+    """
+    GameState holds everything that describes where an adventurer is in their journey.
+
+    Booleans are packed into a single int and the rest are small ints and strings, so a
+    snapshot is a flat tuple that can be hashed, compared and restored in one go.
+    """
+    # The order of the flags is their bit position, only ever append to it
+    FLAGS = (
+        "game_active",
+        "is_heating_forge",
+        "blacksmith_burned_down",
+        "sword_requested",  # Track if the blacksmith has been asked to forge a sword
+        "has_sword",  # Track if the sword has been forged
+        "has_evil_sword",  # Track if the sword has been enchanted by the evil wizard
+        "has_holy_sword",  # Track if the sword has been enchanted by the chapel priest
+        "quest_accepted",  # Track if the quest has been accepted
+        "priest_alive",
+        "has_box",
+    )
+
+    __slots__ = ("flags", "location", "heat_base", "heat_started_at", "failed_sword_attempts")
+
+    # Binary layout: format version, flags, heat base, failed sword attempts, seconds the forge
+    # has been heating (NaN when it is not) and the length of the location name that follows
+    PACKED = struct.Struct("<BIiHdB")
+    PACKED_VERSION = 1
+
+    game_active = _Flag(0)
+    is_heating_forge = _Flag(1)
+    blacksmith_burned_down = _Flag(2)
+    sword_requested = _Flag(3)
+    has_sword = _Flag(4)
+    has_evil_sword = _Flag(5)
+    has_holy_sword = _Flag(6)
+    quest_accepted = _Flag(7)
+    priest_alive = _Flag(8)
+    has_box = _Flag(9)
+
+    INITIAL_FLAGS = game_active.mask | priest_alive.mask
+    # The flags making up the adventurer's sword inventory
+    SWORD_FLAGS = has_sword.mask | has_holy_sword.mask | has_evil_sword.mask
+
+    def __init__(self, location):
+        self.reset(location)
+
+    def reset(self, location):
+        self.flags = self.INITIAL_FLAGS
+        self.location = location
+        self.heat_base = 0  # Heat at the blacksmith forge when it last started or stopped heating
+        self.heat_started_at = None  # Scheduler clock time the forge started heating
+        self.failed_sword_attempts = 0
+
+    def snapshot(self):
+        """
+        Return an immutable, hashable copy of the state.
+        """
+        return (self.flags, self.location, self.heat_base, self.heat_started_at, self.failed_sword_attempts)
+
+    def restore(self, snapshot):
+        self.flags, self.location, self.heat_base, self.heat_started_at, self.failed_sword_attempts = snapshot
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        state = cls.__new__(cls)
+        state.restore(snapshot)
+        return state
+
+    def to_bytes(self, now):
+        """
+        Encode the state compactly. The forge start time is stored relative to now on the scheduler clock,
+        so the state can be decoded by another process.
+        """
+        elapsed = math.nan if self.heat_started_at is None else now - self.heat_started_at
+        location = self.location.encode()
+        return self.PACKED.pack(
+            self.PACKED_VERSION, self.flags, self.heat_base, self.failed_sword_attempts, elapsed, len(location)
+        ) + location
+
+    @classmethod
+    def from_bytes(cls, data, now):
+        """
+        Decode a state encoded by to_bytes, with the forge start time relative to now.
+
+        :raises: ValueError for data in an unknown format.
+        """
+        version, flags, heat_base, failed_sword_attempts, elapsed, length = cls.PACKED.unpack_from(data)
+        if version != cls.PACKED_VERSION:
+            raise ValueError(f"Unsupported game state format version {version}.")
+        location = bytes(data[cls.PACKED.size:cls.PACKED.size + length]).decode()
+        heat_started_at = None if math.isnan(elapsed) else now - elapsed
+        return cls.from_snapshot((flags, location, heat_base, heat_started_at, failed_sword_attempts))
+
+    def copy(self):
+        return self.from_snapshot(self.snapshot())
+
+    def as_dict(self):
+        values = {name: getattr(self, name) for name in self.FLAGS}
+        values.update({name: getattr(self, name) for name in self.__slots__ if name != "flags"})
+        return values
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return self.snapshot() == other.snapshot()
+
+    # States are mutable, hash their snapshot instead
+    __hash__ = None
+
+    def __repr__(self):
+        return f"GameState({self.as_dict()})"
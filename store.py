@@ -0,0 +1,51 @@
+import os
+import sqlite3
+
+
+class SessionStore:
+    """
+    SessionStore keeps saved sessions on disk in a SQLite database, keyed by session id.
+
+    Sessions are stored as the opaque bytes AdventureGame.save returns, so resuming one is a
+    single primary key lookup.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        # Saves are small and frequent, the write-ahead log keeps them from rewriting the database
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Open the store at ADVENTURE_SESSION_STORE, or return None when sessions are not persisted.
+        """
+        path = os.environ.get("ADVENTURE_SESSION_STORE")
+        return cls(path) if path else None
+
+    def save(self, session_id, data):
+        self.save_many([(session_id, data)])
+
+    def save_many(self, sessions):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO sessions (session_id, data) VALUES (?, ?)", sessions)
+
+    def load(self, session_id):
+        row = self.db.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def delete(self, session_id):
+        with self.db:
+            self.db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __contains__(self, session_id):
+        return self.db.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        self.db.close()
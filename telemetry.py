@@ -0,0 +1,88 @@
+from opentelemetry import metrics, trace
+import logging
+import os
+import threading
+
+
+class SessionTelemetry:
+    """
+    The telemetry handles of a single game session. They share the process-wide providers,
+    so creating one costs a couple of small objects.
+    """
+    __slots__ = ("tracer", "meter", "logger", "attributes")
+
+    def __init__(self, tracer, meter, logger, attributes):
+        self.tracer = tracer
+        self.meter = meter
+        # A LoggerAdapter adding the session attributes to every record it logs
+        self.logger = logger
+        self.attributes = attributes
+
+    @classmethod
+    def create(cls, tracer, meter, logger, session_id, adventurer_name):
+        attributes = {"session.id": session_id, "adventurer": adventurer_name}
+        return cls(tracer, meter, logging.LoggerAdapter(logger, attributes), attributes)
+
+    def rename(self, adventurer_name):
+        # The logger adapter holds on to the same dict, so it picks the new name up as well
+        self.attributes["adventurer"] = adventurer_name
+
+
+class NoOpTelemetry:
+    """
+    NoOpTelemetry hands out the OpenTelemetry API no-op tracer and meter, so nothing is recorded
+    or exported. It only needs the API, the SDK and exporters are never imported.
+    """
+    enabled = False
+    log_handler = None
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self.tracer = trace.NoOpTracerProvider().get_tracer(service_name)
+        self.meter = metrics.NoOpMeterProvider().get_meter(service_name)
+        self.logger = logging.getLogger(service_name)
+        # The game logs are clues meant for the dashboards, keep them off the terminal
+        if not self.logger.handlers:
+            self.logger.addHandler(logging.NullHandler())
+
+    def session(self, session_id, adventurer_name):
+        """
+        Return the telemetry for one session.
+        """
+        return SessionTelemetry.create(self.tracer, self.meter, self.logger, session_id, adventurer_name)
+
+    def force_flush(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+def telemetry_enabled():
+    # The standard OpenTelemetry switch to turn the SDK off
+    return os.environ.get("OTEL_SDK_DISABLED", "false").strip().lower() != "true"
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry(service_name, enabled=None, **kwargs):
+    """
+    Return the process-wide telemetry, creating it on first use. The global providers can only
+    be set once, so later calls get the same telemetry whatever they ask for.
+
+    Unless enabled is given, telemetry is on unless OTEL_SDK_DISABLED is true. The OpenTelemetry
+    SDK and exporters are only imported when it is on.
+    """
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            if enabled is None:
+                enabled = telemetry_enabled()
+            if enabled:
+                from otel import TelemetryManager
+                _telemetry = TelemetryManager(service_name, **kwargs)
+            else:
+                _telemetry = NoOpTelemetry(service_name)
+        return _telemetry
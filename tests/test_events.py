@@ -0,0 +1,71 @@
+import logging
+import unittest
+
+from events import ACTION, ACTIONS, SUPPRESSED, EventLog
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class EventLogTest(unittest.TestCase):
+    def setUp(self):
+        logger = logging.getLogger("test.events")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        self.handler = Records()
+        logger.addHandler(self.handler)
+        self.addCleanup(logger.removeHandler, self.handler)
+        self.now = 0.0
+        self.log = EventLog(logging.LoggerAdapter(logger, {"session.id": "test"}), lambda: self.now, burst=2, window=10.0)
+
+    def codes(self):
+        records, self.handler.records = self.handler.records, []
+        return [(getattr(record, "event.code"), getattr(record, "events.suppressed", 0)) for record in records]
+
+    def test_burst_per_window(self):
+        for _ in range(5):
+            self.log.emit(ACTION, location="town", action="chapel", outcome="ok")
+        self.log.emit(ACTION, location="town", action="wizard", outcome="ok")
+        self.assertEqual(self.codes(), [("action", 0)] * 3)
+        self.now = 10.0
+        self.log.emit(ACTION, location="town", action="chapel", outcome="ok")
+        self.assertEqual(self.codes(), [("action", 3)])
+
+    def test_other_attributes_share_a_window(self):
+        # Every batch lists different actions, they must not each get a window
+        for i in range(100):
+            self.log.emit(ACTIONS, location="town", actions=f"chapel, {i}", outcome="ok")
+        self.assertEqual(len(self.log._windows), 1)
+        self.assertEqual(len(self.codes()), 2)
+
+    def test_windows_that_are_over_are_dropped(self):
+        for location in ("town", "chapel", "wizard"):
+            for _ in range(3):
+                self.log.emit(ACTION, location=location, action="look", outcome="ok")
+        self.codes()
+        self.now = 10.0
+        self.log.emit(ACTION, location="blacksmith", action="look", outcome="ok")
+        self.assertEqual(list(self.log._windows), [("action", "blacksmith", "look", "ok")])
+        records = self.handler.records
+        self.assertEqual(self.codes(), [(SUPPRESSED.code, 1)] * 3 + [("action", 0)])
+        self.assertEqual([record.location for record in records[:3]], ["town", "chapel", "wizard"])
+        self.assertEqual(getattr(records[0], "suppressed.code"), "action")
+
+    def test_flush(self):
+        for _ in range(4):
+            self.log.emit(ACTION, location="town", action="look", outcome="ok")
+        self.log.emit(ACTION, location="chapel", action="look", outcome="ok")
+        self.codes()
+        self.log.flush()
+        self.assertEqual(self.codes(), [(SUPPRESSED.code, 2)])
+        self.assertEqual(self.log._windows, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from main import SAVE_HEADER, SAVE_VERSION, UNKNOWN_COMMAND, AdventureGame
+from scheduler import SimulatedScheduler
+from simulation import simulation_telemetry
+
+
+def new_game():
+    game = AdventureGame("test", scheduler=SimulatedScheduler(), telemetry=simulation_telemetry(), session_id="test")
+    game.start_journey()
+    return game
+
+
+class ResolveCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.game = new_game()
+        self.addCleanup(self.game.close)
+
+    def test_menu_number_picks_action(self):
+        actions = self.game.action_menu()[0]
+        self.assertEqual(self.game.resolve_command("1"), actions[0])
+        self.assertEqual(self.game.resolve_command(" 2 "), actions[1])
+
+    def test_number_outside_menu_is_kept(self):
+        self.assertEqual(self.game.resolve_command("99"), "99")
+        self.assertEqual(self.game.take_turn("0"), UNKNOWN_COMMAND)
+
+    def test_non_ascii_digits(self):
+        # Superscripts are digits to str.isdigit but not numbers to int
+        self.assertEqual(self.game.resolve_command("²"), "²")
+        self.assertEqual(self.game.take_turn("²"), UNKNOWN_COMMAND)
+        # Other decimal digits are numbers
+        self.assertEqual(self.game.resolve_command("١"), self.game.action_menu()[0][0])
+
+
+class SaveTest(unittest.TestCase):
+    def resume(self, data, scheduler=None):
+        game = AdventureGame.resume(
+            data, scheduler=scheduler or SimulatedScheduler(), telemetry=simulation_telemetry(), session_id="resumed"
+        )
+        self.addCleanup(game.close)
+        return game
+
+    def test_round_trip_with_heating_forge(self):
+        game = new_game()
+        self.addCleanup(game.close)
+        for command in ("go to town", "blacksmith", "request sword", "heat forge"):
+            game.take_turn(command)
+        game.scheduler.advance(3)
+        data = game.save()
+        version, _, length = SAVE_HEADER.unpack_from(data)
+        self.assertEqual((version, data[SAVE_HEADER.size:SAVE_HEADER.size + length]), (SAVE_VERSION, b"test"))
+
+        resumed = self.resume(data, SimulatedScheduler(start=1000.0))
+        self.assertEqual(resumed.adventurer_name, "test")
+        self.assertEqual(resumed.state.location, game.state.location)
+        self.assertEqual(resumed.state.flags, game.state.flags)
+        self.assertTrue(resumed.state.is_heating_forge)
+        # The forge keeps heating on the clock of the resumed session
+        self.assertEqual(resumed.heat, game.heat)
+        resumed.scheduler.advance(2)
+        self.assertEqual(resumed.heat, game.heat + 2)
+
+    def test_ended_journey(self):
+        game = new_game()
+        game.take_turn("quit")
+        data = game.save()
+        game.close()
+        self.assertEqual(self.resume(data).intro, "Your adventure has ended.")
+
+    def test_unknown_version(self):
+        game = new_game()
+        self.addCleanup(game.close)
+        data = bytearray(game.save())
+        data[0] = SAVE_VERSION + 1
+        with self.assertRaises(ValueError):
+            self.resume(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from gauges import SessionGauges
+from tests.test_game import new_game
+
+
+class ForgeHeatTest(unittest.TestCase):
+    def setUp(self):
+        self.reader = InMemoryMetricReader()
+        self.gauges = SessionGauges(MeterProvider(metric_readers=[self.reader]).get_meter("test"))
+
+    def forge_heat(self):
+        for resource_metrics in self.reader.get_metrics_data().resource_metrics:
+            for scope_metrics in resource_metrics.scope_metrics:
+                for metric in scope_metrics.metrics:
+                    if metric.name == "forge_heat":
+                        return {point.attributes["aggregation"]: point.value for point in metric.data.data_points}
+        return {}
+
+    def test_series_do_not_grow_with_sessions(self):
+        for _ in range(3):
+            games = [new_game() for _ in range(20)]
+            for game in games:
+                self.gauges.add(game)
+            self.assertEqual(set(self.forge_heat()), {"max", "mean"})
+            for game in games:
+                self.gauges.discard(game)
+                game.close()
+        self.assertEqual(self.forge_heat(), {})
+
+    def test_remote_sessions(self):
+        game = new_game()
+        self.addCleanup(game.close)
+        snapshot = game.gauges.snapshot()
+        self.gauges.update_remote(0, {**snapshot, "sessions": 2, "heat_max": 6, "heat_sum": 8})
+        self.gauges.update_remote(1, {**snapshot, "sessions": 0, "heat_max": 0, "heat_sum": 0})
+        self.assertEqual(self.forge_heat(), {"max": 6, "mean": 4})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_OFF
+from opentelemetry.trace import NonRecordingSpan, SpanContext, Status, StatusCode, TraceFlags, TraceState
+
+from otel import InterestingTraceSpanProcessor, KeepInterestingSampler, RateLimitingSampler
+
+
+def interesting_tracer(**bounds):
+    exporter = InMemorySpanExporter()
+    processor = InterestingTraceSpanProcessor(SimpleSpanProcessor(exporter), **bounds)
+    provider = TracerProvider(sampler=KeepInterestingSampler(ALWAYS_OFF))
+    provider.add_span_processor(processor)
+    return provider.get_tracer("test"), processor, exporter
+
+
+class RateLimitingSamplerTest(unittest.TestCase):
+    def test_keeps_parent_trace_state(self):
+        trace_state = TraceState([("vendor", "value")])
+        parent = trace.set_span_in_context(NonRecordingSpan(
+            SpanContext(1, 2, is_remote=True, trace_flags=TraceFlags(0), trace_state=trace_state)
+        ))
+        sampler = RateLimitingSampler(1)
+        sampled = sampler.should_sample(parent, 1, "span")
+        dropped = sampler.should_sample(parent, 1, "span")
+        self.assertTrue(sampled.decision.is_sampled())
+        self.assertFalse(dropped.decision.is_sampled())
+        self.assertEqual(sampled.trace_state, trace_state)
+        self.assertEqual(dropped.trace_state, trace_state)
+
+
+class InterestingTraceSpanProcessorTest(unittest.TestCase):
+    def test_keeps_only_traces_with_errors(self):
+        tracer, processor, exporter = interesting_tracer()
+        with tracer.start_as_current_span("fine"):
+            with tracer.start_as_current_span("child"):
+                pass
+        with tracer.start_as_current_span("broken"):
+            with tracer.start_as_current_span("child") as child:
+                child.set_status(Status(StatusCode.ERROR))
+        self.assertEqual(sorted(span.name for span in exporter.get_finished_spans()), ["broken", "child"])
+        self.assertEqual(processor.buffered, 0)
+
+    def test_total_spans_are_bounded(self):
+        tracer, processor, exporter = interesting_tracer(max_buffered=10)
+        roots = [tracer.start_span(f"root {i}") for i in range(5)]
+        for root in roots:
+            context = trace.set_span_in_context(root)
+            for _ in range(4):
+                tracer.start_span("child", context=context).end()
+        self.assertLessEqual(processor.buffered, 10)
+        self.assertEqual(processor.evicted_traces, 3)
+        self.assertEqual(processor.evicted_spans, 12)
+        for root in roots:
+            root.set_status(Status(StatusCode.ERROR))
+            root.end()
+        self.assertEqual(processor.buffered, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import unittest
+
+from server import CLOSE, TEXT, ConnectionClosed, GameClient, GameServer, ProtocolError, _unmask, encode_frame, read_frame
+
+
+def read(data, max_size=1 << 20, masked=True):
+    async def read_one():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_frame(reader, max_size, masked)
+    return asyncio.run(read_one())
+
+
+class WebSocketFrameTest(unittest.TestCase):
+    def test_unmask(self):
+        mask = b"\x01\x02\x03\x04"
+        payload = os.urandom(11)
+        expected = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        self.assertEqual(_unmask(payload, mask), expected)
+        self.assertEqual(_unmask(expected, mask), payload)
+        self.assertEqual(_unmask(b"", mask), b"")
+
+    def test_round_trip_lengths(self):
+        # Each length encoding: 7 bits, 16 bits after 126 and 64 bits after 127
+        for length, second in ((0, 0), (125, 125), (126, 126), (65535, 126), (65536, 127)):
+            payload = os.urandom(length)
+            server_frame = encode_frame(TEXT, payload)
+            self.assertEqual(server_frame[1], second)
+            self.assertEqual(read(server_frame, masked=False), (True, TEXT, payload))
+            client_frame = encode_frame(TEXT, payload, mask=b"\xa1\xb2\xc3\xd4")
+            self.assertEqual(client_frame[1], 0x80 | second)
+            self.assertEqual(read(client_frame), (True, TEXT, payload))
+
+    def test_known_frame(self):
+        # The masked "Hello" example of RFC 6455 section 5.7
+        frame = bytes.fromhex("818537fa213d7f9f4d5158")
+        self.assertEqual(encode_frame(TEXT, b"Hello", mask=bytes.fromhex("37fa213d")), frame)
+        self.assertEqual(read(frame), (True, TEXT, b"Hello"))
+        self.assertEqual(encode_frame(TEXT, b"Hello"), bytes.fromhex("810548656c6c6f"))
+
+    def test_not_final_frame(self):
+        frame = bytes([TEXT]) + encode_frame(TEXT, b"part")[1:]
+        self.assertEqual(read(frame, masked=False), (False, TEXT, b"part"))
+
+    def test_rejects_wrong_masking(self):
+        with self.assertRaises(ProtocolError):
+            read(encode_frame(CLOSE, b""), masked=True)
+        with self.assertRaises(ProtocolError):
+            read(encode_frame(CLOSE, b"", mask=b"abcd"), masked=False)
+
+    def test_rejects_long_frames(self):
+        with self.assertRaises(ProtocolError):
+            read(encode_frame(TEXT, b"x" * 200, mask=b"abcd"), max_size=100)
+
+    def test_truncated_frame(self):
+        with self.assertRaises(asyncio.IncompleteReadError):
+            read(encode_frame(TEXT, b"Hello", mask=b"abcd")[:-1])
+
+
+class BrokenStoreEngine:
+    # An engine whose sessions cannot be saved when they are closed
+    def create_session(self, adventurer_name):
+        return "session"
+
+    def welcome(self, session_id):
+        return "Welcome"
+
+    def is_active(self, session_id):
+        return True
+
+    def close_session(self, session_id):
+        raise OSError("The session store is unavailable.")
+
+
+class GameServerTest(unittest.TestCase):
+    def test_connection_is_closed_when_closing_the_session_fails(self):
+        async def run():
+            server = await GameServer(BrokenStoreEngine(), port=0, idle_timeout=0.2).start()
+            client, _ = await GameClient.connect(server.host, server.port)
+            client.write("tester")
+            self.assertEqual(await client.read(), "Welcome")
+            with self.assertLogs("server", "ERROR"):
+                self.assertIn("stood still", await client.read())
+                with self.assertRaises(ConnectionClosed):
+                    await client.read()
+            self.assertEqual(server.connections, 0)
+            client.writer.close()
+            await server.close()
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
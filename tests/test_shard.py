@@ -0,0 +1,97 @@
+import asyncio
+import os
+import pickle
+import unittest
+from unittest import mock
+
+from main import AdventureGame
+from shard import FRAME, HashRing, ShardedEngine, _failure, _reply_frame
+
+KEYS = [f"session-{i}" for i in range(4000)]
+
+
+class HashRingTest(unittest.TestCase):
+    def placement(self, ring):
+        return {key: ring.node_for(key) for key in KEYS}
+
+    def test_placement_is_stable(self):
+        # The hash does not depend on the process, so another ring over the same nodes agrees
+        self.assertEqual(self.placement(HashRing(range(4))), self.placement(HashRing([3, 1, 0, 2])))
+        self.assertEqual(HashRing(range(4)).node_for("session-0"), HashRing(range(4)).node_for("session-0"))
+
+    def test_keys_are_spread(self):
+        counts = {}
+        for node in self.placement(HashRing(range(4))).values():
+            counts[node] = counts.get(node, 0) + 1
+        self.assertEqual(set(counts), set(range(4)))
+        for count in counts.values():
+            self.assertGreater(count, len(KEYS) / 4 / 2)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        before = self.placement(HashRing(range(4)))
+        after = self.placement(HashRing(range(5)))
+        moved = [key for key in KEYS if before[key] != after[key]]
+        self.assertTrue(all(after[key] == 4 for key in moved))
+        # About 1/5 of the keys move to the new node
+        self.assertLess(abs(len(moved) / len(KEYS) - 1 / 5), 0.1)
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        before = self.placement(HashRing(range(5)))
+        after = self.placement(HashRing([0, 1, 3, 4]))
+        self.assertEqual({key for key in KEYS if before[key] != after[key]}, {key for key in KEYS if before[key] == 2})
+
+
+class Unpicklable(Exception):
+    def __init__(self, message, code):
+        # Unpickling an exception calls it with its args only, which misses code
+        super().__init__(message)
+        self.code = code
+
+
+class ReplyFrameTest(unittest.TestCase):
+    def replies(self, replies):
+        data = _reply_frame(replies)
+        self.assertEqual(FRAME.unpack_from(data)[0], len(data) - FRAME.size)
+        return pickle.loads(data[FRAME.size:])
+
+    def test_picklable_replies(self):
+        self.assertEqual(self.replies([(1, True, "ok"), (None, True, {"sessions": 0})]), [(1, True, "ok"), (None, True, {"sessions": 0})])
+
+    def test_unpicklable_reply_only_fails_its_request(self):
+        error = Exception("boom")
+        error.callback = lambda: None
+        replies = self.replies([(1, True, "ok"), (2, False, error), (3, True, lambda: None)])
+        self.assertEqual(replies[0], (1, True, "ok"))
+        for (request_id, ok, value), expected in zip(replies[1:], (2, 3)):
+            self.assertEqual((request_id, ok, type(value)), (expected, False, RuntimeError))
+
+    def test_failures_can_be_raised_again(self):
+        self.assertIsInstance(_failure(KeyError("session")), KeyError)
+        error = _failure(Unpicklable("boom", 3))
+        self.assertIsInstance(error, RuntimeError)
+        self.assertIn("boom", str(error))
+
+
+@mock.patch.dict(os.environ, {"OTEL_SDK_DISABLED": "true"})
+class ShardedEngineTest(unittest.TestCase):
+    def test_exited_worker_is_replaced(self):
+        async def run():
+            engine = ShardedEngine(AdventureGame, 2)
+            session_ids = [await engine.create_session(f"bot-{i}") for i in range(8)]
+            exited = engine.shards[0]
+            exited.process.kill()
+            with self.assertLogs("shard", "WARNING"):
+                await exited.reader
+            self.assertIsNot(engine.shards[0], exited)
+            # The sessions of the other worker are still there, and new ones go to both
+            for session_id in session_ids:
+                if engine.shard_of(session_id) == 1:
+                    await engine.submit(session_id, "go to town")
+            for i in range(8):
+                await engine.submit(await engine.create_session(f"new-{i}"), "go to town")
+            await engine.close()
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import tempfile
+import unittest
+
+from spool import RingSpool
+
+
+def record(i, size=20):
+    return bytes([i]) * size
+
+
+class RingSpoolTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "spool")
+
+    def open(self, capacity=100):
+        spool = RingSpool(self.path, capacity)
+        self.addCleanup(spool.close)
+        return spool
+
+    def drain(self, spool):
+        payloads = []
+        while (head := spool.peek()) is not None:
+            position, signal, payload = head
+            payloads.append((signal, payload))
+            spool.pop(position)
+        return payloads
+
+    def test_first_in_first_out(self):
+        spool = self.open()
+        spool.append(0, record(1))
+        spool.append(2, record(2))
+        self.assertEqual(self.drain(spool), [(0, record(1)), (2, record(2))])
+        self.assertEqual((len(spool), spool.used), (0, 0))
+
+    def test_wraps_around_the_end(self):
+        # Records of 25 bytes in 100: the third pass writes across the end of the data region
+        spool = self.open()
+        for i in range(10):
+            spool.append(1, record(i))
+            spool.append(1, record(i + 100))
+            self.assertEqual(self.drain(spool), [(1, record(i)), (1, record(i + 100))])
+        spool.append(1, record(7, 90))
+        self.assertEqual(self.drain(spool), [(1, record(7, 90))])
+
+    def test_drops_oldest_when_full(self):
+        spool = self.open()
+        for i in range(6):
+            spool.append(0, record(i))
+        self.assertEqual(spool.dropped, 2)
+        self.assertEqual([payload for _, payload in self.drain(spool)], [record(i) for i in range(2, 6)])
+
+    def test_rejects_records_larger_than_capacity(self):
+        spool = self.open()
+        self.assertFalse(spool.append(0, record(1, 100)))
+        self.assertEqual((len(spool), spool.dropped), (0, 1))
+
+    def test_pop_after_head_was_dropped(self):
+        spool = self.open()
+        for i in range(4):
+            spool.append(0, record(i))
+        position, _, payload = spool.peek()
+        self.assertEqual(payload, record(0))
+        # The record being replayed is dropped to make room before the replay pops it
+        spool.append(0, record(4))
+        spool.pop(position)
+        self.assertEqual([payload for _, payload in self.drain(spool)], [record(i) for i in range(1, 5)])
+
+    def test_survives_reopening(self):
+        spool = RingSpool(self.path, 100)
+        for i in range(5):
+            spool.append(1, record(i))
+        spool.close()
+        spool = self.open()
+        self.assertEqual([payload for _, payload in self.drain(spool)], [record(i) for i in range(1, 5)])
+
+    def test_reopening_keeps_wrapped_records(self):
+        spool = RingSpool(self.path, 100)
+        # Records of 30 bytes: the last one is written across the end of the data region
+        for i in range(7):
+            spool.append(1, record(i, 25))
+        spool.pop(spool.peek()[0])
+        header = RingSpool.HEADER.unpack_from(spool._map)
+        spool.close()
+        spool = self.open()
+        self.assertEqual(RingSpool.HEADER.unpack_from(spool._map), header)
+        self.assertEqual([payload for _, payload in self.drain(spool)], [record(i, 25) for i in range(5, 7)])
+
+    def test_other_version_or_size_is_treated_as_empty(self):
+        spool = RingSpool(self.path, 100)
+        spool.append(1, record(1))
+        spool.close()
+        spool = RingSpool(self.path, 200)
+        self.assertEqual(len(spool), 0)
+        spool.append(1, record(2))
+        spool.close()
+        with open(self.path, "r+b") as f:
+            f.seek(len(RingSpool.MAGIC))
+            f.write(RingSpool.HEADER.pack(RingSpool.MAGIC, RingSpool.VERSION + 1, 0, 0, 0, 0)[len(RingSpool.MAGIC):])
+        spool = RingSpool(self.path, 200)
+        self.addCleanup(spool.close)
+        self.assertEqual(len(spool), 0)
+
+    def test_corrupt_header_is_treated_as_empty(self):
+        spool = RingSpool(self.path, 100)
+        spool.append(1, record(1))
+        spool.close()
+        with open(self.path, "r+b") as f:
+            header = bytearray(f.read(RingSpool.HEADER.size))
+            magic, version, head, tail, used, count = RingSpool.HEADER.unpack(header)
+            # A head outside the data region, then a count the records do not add up to
+            for corrupt in ((10 ** 6, tail, used, count), (head, tail, used, count + 3)):
+                f.seek(0)
+                f.write(RingSpool.HEADER.pack(magic, version, *corrupt))
+                f.flush()
+                spool = RingSpool(self.path, 100)
+                self.assertEqual((len(spool), spool.peek()), (0, None))
+                spool.append(1, record(2))
+                self.assertEqual(self.drain(spool), [(1, record(2))])
+                spool.close()
+
+    def test_corrupt_record_length_is_treated_as_empty(self):
+        spool = RingSpool(self.path, 100)
+        spool.append(1, record(1))
+        spool.close()
+        with open(self.path, "r+b") as f:
+            f.seek(RingSpool.HEADER_SIZE)
+            f.write(RingSpool.RECORD.pack(10 ** 6, 1))
+        spool = self.open()
+        self.assertEqual(len(spool), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import math
+import unittest
+
+from state import GameState
+
+
+class PackedStateTest(unittest.TestCase):
+    def test_round_trip(self):
+        state = GameState("blacksmith")
+        state.has_sword = True
+        state.quest_accepted = True
+        state.failed_sword_attempts = 2
+        state.heat_base = -3
+        self.assertEqual(GameState.from_bytes(state.to_bytes(10.0), 500.0), state)
+
+    def test_heating_forge_is_relative_to_now(self):
+        state = GameState("blacksmith")
+        state.is_heating_forge = True
+        state.heat_started_at = 4.0
+        restored = GameState.from_bytes(state.to_bytes(10.0), 100.0)
+        self.assertTrue(restored.is_heating_forge)
+        self.assertEqual(restored.heat_started_at, 94.0)
+
+    def test_layout(self):
+        state = GameState("chapel")
+        data = state.to_bytes(0.0)
+        self.assertEqual(len(data), GameState.PACKED.size + len("chapel"))
+        version, flags, heat_base, failed_sword_attempts, elapsed, length = GameState.PACKED.unpack_from(data)
+        self.assertEqual((version, flags, length), (GameState.PACKED_VERSION, GameState.INITIAL_FLAGS, len("chapel")))
+        self.assertTrue(math.isnan(elapsed))
+        self.assertEqual(data[GameState.PACKED.size:], b"chapel")
+
+    def test_non_ascii_location(self):
+        state = GameState("château")
+        self.assertEqual(GameState.from_bytes(state.to_bytes(0.0), 0.0).location, "château")
+
+    def test_unknown_version(self):
+        data = bytearray(GameState("town").to_bytes(0.0))
+        data[0] = GameState.PACKED_VERSION + 1
+        with self.assertRaises(ValueError):
+            GameState.from_bytes(data, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
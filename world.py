@@ -0,0 +1,81 @@
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+import json
+import os
+
+# The world definition shipped next to the game
+WORLD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "world.json")
+
+# An action a player can take at a location. effect and pre_requisite are plain functions
+# looked up by name on the game class, and are called with the session as their only argument.
+Action = namedtuple("Action", ["name", "next_location", "message", "effect", "pre_requisite"])
+
+# dispatch maps normalized (stripped, lower case) commands to actions, menu lists the action names
+# in the order they are offered to the player.
+Location = namedtuple("Location", ["name", "description", "actions", "pre_requisite", "dispatch", "menu"])
+
+World = namedtuple("World", ["start_location", "locations"])
+
+
+def normalize_command(command):
+    return command.strip().lower()
+
+
+def _resolve(handlers, name, where):
+    if name is None:
+        return None
+    handler = getattr(handlers, name, None)
+    if not callable(handler):
+        raise ValueError(f"{where} refers to unknown handler '{name}'.")
+    return handler
+
+
+def compile_world(definition, handlers):
+    """
+    Compile a world definition into an immutable structure that all sessions share.
+
+    :param definition: The parsed world definition, see world.json.
+    :param handlers: The class implementing the effects and prerequisites named in the definition.
+    :return: A World whose locations map names to Location records.
+    :raises: ValueError if the definition refers to unknown locations or handlers.
+    """
+    raw_locations = definition["locations"]
+    locations = {}
+    for location_name, raw_location in raw_locations.items():
+        actions = {}
+        for action_name, raw_action in raw_location.get("actions", {}).items():
+            where = f"Action '{action_name}' at '{location_name}'"
+            next_location = raw_action.get("next_location")
+            if next_location is not None and next_location not in raw_locations:
+                raise ValueError(f"{where} leads to unknown location '{next_location}'.")
+            actions[action_name] = Action(
+                name=action_name,
+                next_location=next_location,
+                message=raw_action.get("message"),
+                effect=_resolve(handlers, raw_action.get("effect"), where),
+                pre_requisite=_resolve(handlers, raw_action.get("pre_requisite"), where)
+            )
+
+        locations[location_name] = Location(
+            name=location_name,
+            description=raw_location["description"],
+            actions=MappingProxyType(actions),
+            pre_requisite=_resolve(handlers, raw_location.get("pre_requisite"), f"Location '{location_name}'"),
+            dispatch=MappingProxyType({normalize_command(name): action for name, action in actions.items()}),
+            menu=tuple(actions)
+        )
+
+    start_location = definition.get("start_location", "start")
+    if start_location not in locations:
+        raise ValueError(f"Unknown start location '{start_location}'.")
+    return World(start_location=start_location, locations=MappingProxyType(locations))
+
+
+@lru_cache(maxsize=None)
+def load_world(handlers, path=WORLD_FILE):
+    """
+    Load and compile the world once per process for the given handler class.
+    """
+    with open(path, encoding="utf-8") as f:
+        return compile_world(json.load(f), handlers)